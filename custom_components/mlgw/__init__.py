@@ -3,9 +3,7 @@
 import asyncio
 import logging
 
-import requests
-from requests.auth import HTTPBasicAuth, HTTPDigestAuth
-from requests.exceptions import RequestException
+import aiohttp
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry, ConfigEntryNotReady
@@ -16,7 +14,7 @@ from homeassistant.const import (
     CONF_PORT,
     CONF_USERNAME,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import (
     config_validation as cv,
     device_registry as dr,
@@ -25,31 +23,47 @@ from homeassistant.helpers import (
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.typing import ServiceDataType
 
+from .api import MLGWAuthenticationError, async_get_mlgw_configuration, clear_cache
 from .const import (
     ATTR_MLGW_ACTION,
     ATTR_MLGW_BUTTON,
-    BASE_URL,
+    ATTR_MLGW_DURATION,
     BEO4_CMDS,
+    CAPTURE_FILE,
+    CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    CONF_ML_EVENT_FROM_DEVICES,
+    CONF_ML_EVENT_PAYLOAD_TYPES,
+    CONF_ML_EVENT_TO_DEVICES,
+    CONF_ML_EVENT_TYPES,
     CONF_MLGW_AVAILABLE_SOURCES,
+    CONF_MLGW_CAPTURE,
+    CONF_MLGW_CAPTURE_MAX_SIZE,
     CONF_MLGW_DEFAULT_SOURCE,
     CONF_MLGW_DEVICE_MLID,
     CONF_MLGW_DEVICE_MLN,
     CONF_MLGW_DEVICE_NAME,
     CONF_MLGW_DEVICE_ROOM,
     CONF_MLGW_USE_MLLOG,
+    DEFAULT_CAPTURE_MAX_SIZE,
+    DEFAULT_PROFILE_DURATION,
+    DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
     DOMAIN,
+    MAX_PROFILE_DURATION,
+    ML_EVENT_FILTER_OPTIONS,
     MLGW_AVAILABLE_SOURCES,
-    MLGW_CONFIG_JSON_PATH,
     MLGW_DEFAULT_SOURCE,
     MLGW_DEVICES,
     MLGW_GATEWAY,
     MLGW_GATEWAY_CONFIGURATION_DATA,
-    TIMEOUT,
+    MLGW_STORE,
     reverse_ml_destselectordict,
     reverse_ml_selectedsourcedict,
     reverse_mlgw_virtualactiondict,
 )
 from .gateway import MasterLinkGateway, create_mlgw_gateway
+from .journal import MLGWJournal
+from .profiling import MLGWProfiler
+from .store import MLGWStore
 
 CONFIG_SCHEMA = vol.Schema(
     {
@@ -66,6 +80,14 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Optional(
                     CONF_MLGW_AVAILABLE_SOURCES, default=MLGW_AVAILABLE_SOURCES
                 ): cv.ensure_list,
+                vol.Optional(CONF_ML_EVENT_PAYLOAD_TYPES): cv.ensure_list,
+                vol.Optional(
+                    CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+                    default=DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+                ): cv.ensure_list,
+                vol.Optional(CONF_ML_EVENT_TYPES): cv.ensure_list,
+                vol.Optional(CONF_ML_EVENT_FROM_DEVICES): cv.ensure_list,
+                vol.Optional(CONF_ML_EVENT_TO_DEVICES): cv.ensure_list,
                 vol.Required(CONF_DEVICES): vol.All(
                     cv.ensure_list,
                     [
@@ -85,6 +107,7 @@ CONFIG_SCHEMA = vol.Schema(
 
 SERVICE_ALL_STANDBY = "all_standby"
 SERVICE_VIRTUAL_BUTTON = "virtual_button"
+SERVICE_START_PROFILING = "start_profiling"
 
 SERVICE_VIRTUAL_BUTTON_SCHEMA = vol.Schema(
     {
@@ -93,12 +116,20 @@ SERVICE_VIRTUAL_BUTTON_SCHEMA = vol.Schema(
     }
 )
 
+SERVICE_START_PROFILING_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_MLGW_DURATION, default=DEFAULT_PROFILE_DURATION): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_PROFILE_DURATION)
+        ),
+    }
+)
+
 _LOGGER = logging.getLogger(__name__)
 
 
 # TODO List the platforms that you want to support.
 # For your initial PR, limit it to 1 platform.
-PLATFORMS = ["media_player"]
+PLATFORMS = ["media_player", "sensor"]
 
 
 def yaml_to_json_config(manual_devices, availabe_sources):
@@ -194,6 +225,9 @@ async def async_setup(hass: HomeAssistant, config: dict):
         use_mllog,
         default_source=default_source,
         available_sources=available_sources,
+        ml_event_filter={
+            k: v for k, v in mlgw_config.items() if k in ML_EVENT_FILTER_OPTIONS
+        },
     )
     if not gateway:
         return False
@@ -211,30 +245,8 @@ async def async_setup(hass: HomeAssistant, config: dict):
     return True
 
 
-def get_mlgw_configuration_data(host: str, username: str, password: str):
-    """Get the configuration data from the mlgw using the mlgwpservices.json endpoint."""
-
-    # try with Digest Auth first
-    response = requests.get(
-        BASE_URL.format(host, MLGW_CONFIG_JSON_PATH),
-        timeout=TIMEOUT,
-        auth=HTTPDigestAuth(username, password),
-    )
-    # if unauthorized use fallback to Basic Auth
-    if response.status_code == 401:
-        response = requests.get(
-            BASE_URL.format(host, MLGW_CONFIG_JSON_PATH),
-            timeout=TIMEOUT,
-            auth=HTTPBasicAuth(username, password),
-        )
-    if response.status_code != 200:
-        return None
-
-    return response.json()
-
-
 def register_services(hass: HomeAssistant, gateway: MasterLinkGateway):
-    """Register the Virtual Button and All Standby services."""
+    """Register the Virtual Button, All Standby and Start Profiling services."""
 
     def virtual_button_press(service: ServiceDataType):
         if not gateway:
@@ -251,6 +263,18 @@ def register_services(hass: HomeAssistant, gateway: MasterLinkGateway):
         gateway.mlgw_send_all_standby()
         return True
 
+    @callback
+    def start_profiling(service: ServiceDataType):
+        if not gateway:
+            return False
+        if gateway.profiler is None:
+            gateway.profiler = MLGWProfiler(hass, gateway)
+        if gateway.profiler.running:
+            _LOGGER.warning("MLGW profiling is already running")
+            return False
+        gateway.profiler.start(service.data[ATTR_MLGW_DURATION])
+        return True
+
     # Register the services
     hass.services.async_register(
         DOMAIN,
@@ -266,6 +290,13 @@ def register_services(hass: HomeAssistant, gateway: MasterLinkGateway):
         schema=vol.Schema({}),
     )
 
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_START_PROFILING,
+        start_profiling,
+        schema=SERVICE_START_PROFILING_SCHEMA,
+    )
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up MasterLink Gateway from a config entry."""
@@ -275,16 +306,31 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     username = entry.data.get(CONF_USERNAME)
     use_mllog = entry.data.get(CONF_MLGW_USE_MLLOG)
 
-    try:
-        mlgw_configurationdata = await hass.async_add_executor_job(
-            get_mlgw_configuration_data, host, username, password
-        )
-    except RequestException as ex:
-        # this will cause Home Assistant to retry setting up the integration later.
-        raise ConfigEntryNotReady(f"Cannot connect to {host}, is it on?") from ex
-
+    # use the last good configuration if there is one, and check it with the gateway
+    # in the background, so the startup doesn't wait for the web server of the gateway.
+    store = MLGWStore(hass, entry.entry_id)
+    await store.async_load()
+    mlgw_configurationdata = store.configuration
     if mlgw_configurationdata is None:
-        return False
+        try:
+            mlgw_configurationdata = await async_get_mlgw_configuration(
+                hass, host, username, password
+            )
+        except MLGWAuthenticationError:
+            return False
+        except (aiohttp.ClientError, TimeoutError) as ex:
+            # this will cause Home Assistant to retry setting up the integration later.
+            raise ConfigEntryNotReady(f"Cannot connect to {host}, is it on?") from ex
+
+        if mlgw_configurationdata is None:
+            return False
+        await store.async_save_configuration(mlgw_configurationdata)
+    else:
+        entry.async_create_background_task(
+            hass,
+            async_revalidate_configuration(hass, entry, store),
+            f"{DOMAIN} revalidate configuration",
+        )
 
     gateway = await create_mlgw_gateway(
         hass,
@@ -294,15 +340,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         mlgw_configurationdata,
         use_mllog,
         entry.entry_id,
+        ml_event_filter=entry.options,
     )
     if not gateway:
-        return False
+        # this will cause Home Assistant to retry setting up the integration later.
+        raise ConfigEntryNotReady(f"Cannot connect to the MLGW API of {host}")
+
+    gateway.set_keepalive(entry.options)
+    await async_update_capture(hass, entry, gateway)
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
 
     hass.data[DOMAIN][entry.entry_id] = {}
     hass.data[DOMAIN][entry.entry_id][MLGW_GATEWAY] = gateway
     hass.data[DOMAIN][entry.entry_id][MLGW_GATEWAY_CONFIGURATION_DATA] = (
         mlgw_configurationdata
     )
+    hass.data[DOMAIN][entry.entry_id][MLGW_STORE] = store
     hass.data[DOMAIN][entry.entry_id]["serial"] = entry.unique_id
     _LOGGER.debug("Serial: %s", entry.unique_id)
 
@@ -325,6 +378,72 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     return True
 
 
+async def async_revalidate_configuration(
+    hass: HomeAssistant, entry: ConfigEntry, store: MLGWStore
+):
+    """Check the stored configuration with the gateway, and reload the entry if it changed."""
+    host = entry.data.get(CONF_HOST)
+    try:
+        configuration = await async_get_mlgw_configuration(
+            hass,
+            host,
+            entry.data.get(CONF_USERNAME),
+            entry.data.get(CONF_PASSWORD),
+            store.configuration,
+        )
+    except MLGWAuthenticationError:
+        _LOGGER.error(
+            "Cannot check the configuration of %s: the username or password is refused,"
+            " using the stored configuration",
+            host,
+        )
+        return
+    except (aiohttp.ClientError, TimeoutError) as ex:
+        _LOGGER.warning("Cannot check the configuration of %s: %s", host, ex)
+        return
+
+    if configuration is None or configuration.get(
+        "timestamp"
+    ) == store.configuration.get("timestamp"):
+        _LOGGER.debug("Stored MLGW configuration is current")
+        return
+
+    _LOGGER.info("MLGW configuration of %s changed, reloading", host)
+    await store.async_save_configuration(configuration)
+    hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+
+
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Apply the new ML event filter, keepalive and capture when the options change."""
+    gateway: MasterLinkGateway = hass.data[DOMAIN][entry.entry_id][MLGW_GATEWAY]
+    gateway.set_ml_event_filter(entry.options)
+    gateway.set_keepalive(entry.options)
+    await async_update_capture(hass, entry, gateway)
+
+
+async def async_update_capture(
+    hass: HomeAssistant, entry: ConfigEntry, gateway: MasterLinkGateway
+):
+    """Start or stop recording the traffic of the gateway, as set in the options."""
+    journal = gateway.journal
+    if entry.options.get(CONF_MLGW_CAPTURE, False):
+        max_bytes = (
+            entry.options.get(CONF_MLGW_CAPTURE_MAX_SIZE, DEFAULT_CAPTURE_MAX_SIZE)
+            * 1024
+            * 1024
+        )
+        if journal is None:
+            path = hass.config.path(CAPTURE_FILE.format(entry.entry_id))
+            gateway.journal = MLGWJournal(hass, path, max_bytes)
+            _LOGGER.info("Capturing the MLGW traffic into %s", path)
+        else:
+            journal.max_bytes = max_bytes
+    elif journal is not None:
+        gateway.journal = None
+        await journal.async_close()
+        _LOGGER.info("Stopped capturing the MLGW traffic into %s", journal.path)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a config entry."""
     _LOGGER.debug("Async unload entry")
@@ -339,10 +458,18 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     )
     if unload_ok:
         hass.services.async_remove(DOMAIN, SERVICE_VIRTUAL_BUTTON)
+        hass.services.async_remove(DOMAIN, SERVICE_START_PROFILING)
         gateway = hass.data[DOMAIN][entry.entry_id].pop(MLGW_GATEWAY)
         await gateway.terminate_async()
+        clear_cache(entry.data.get(CONF_HOST))
     else:
         _LOGGER.warning("Error Unloading Entries")
         return False
 
     return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the stored configuration when the config entry is removed."""
+    await MLGWStore(hass, entry.entry_id).async_remove()
+    clear_cache(entry.data.get(CONF_HOST))
@@ -0,0 +1,184 @@
+"""HTTP client for the mlgwpservices.json configuration endpoint of the MLGW / BLGW.
+
+The MLGW uses Digest authentication and the BLGW uses Basic authentication. The scheme
+that each host accepted (and the last Digest challenge) is remembered, so after the first
+contact every fetch is a single round trip on the shared Home Assistant aiohttp session.
+"""
+
+from email.utils import formatdate
+import hashlib
+import logging
+import os
+import re
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import BASE_URL, MLGW_CONFIG_JSON_PATH, TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+AUTH_BASIC = "basic"
+AUTH_DIGEST = "digest"
+
+# Cached by host: the authentication scheme that worked, the last Digest challenge and
+# the last configuration received (used for conditional requests). Cleared by clear_cache
+# when the config entry of the host is unloaded.
+_auth_schemes: dict = {}
+_digest_challenges: dict = {}
+_configurations: dict = {}
+
+_CHALLENGE_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^,\s]*))')
+
+
+class MLGWAuthenticationError(Exception):
+    """Error to indicate the gateway refused the username or password."""
+
+
+def clear_cache(host: str) -> None:
+    """Forget what was cached for a host."""
+    _auth_schemes.pop(host, None)
+    _digest_challenges.pop(host, None)
+    _configurations.pop(host, None)
+
+
+def _parse_challenge(header: str) -> dict:
+    """Parse the parameters of a 'Digest realm="..", nonce=".."' WWW-Authenticate header."""
+    return {
+        key.lower(): quoted if quoted else plain
+        for key, quoted, plain in _CHALLENGE_PARAM.findall(header)
+    }
+
+
+def _md5(data: str) -> str:
+    return hashlib.md5(data.encode()).hexdigest()  # noqa: S324 - required by RFC 2617
+
+
+def _digest_authorization(challenge: dict, uri: str, username: str, password: str):
+    """Compute the Authorization header answering a Digest challenge (RFC 2617)."""
+    challenge["nc"] = challenge.get("nc", 0) + 1
+    nc = f"{challenge['nc']:08x}"
+    cnonce = os.urandom(8).hex()
+    realm = challenge.get("realm", "")
+    nonce = challenge.get("nonce", "")
+    algorithm = challenge.get("algorithm", "MD5")
+    ha1 = _md5(f"{username}:{realm}:{password}")
+    if algorithm.upper() == "MD5-SESS":
+        ha1 = _md5(f"{ha1}:{nonce}:{cnonce}")
+    ha2 = _md5(f"GET:{uri}")
+    qop = "auth" if "auth" in challenge.get("qop", "").split(",") else None
+    if qop:
+        response = _md5(f"{ha1}:{nonce}:{nc}:{cnonce}:{qop}:{ha2}")
+    else:
+        response = _md5(f"{ha1}:{nonce}:{ha2}")
+
+    header = (
+        f'Digest username="{username}", realm="{realm}", nonce="{nonce}", '
+        f'uri="{uri}", response="{response}", algorithm={algorithm}'
+    )
+    if "opaque" in challenge:
+        header += f', opaque="{challenge["opaque"]}"'
+    if qop:
+        header += f', qop={qop}, nc={nc}, cnonce="{cnonce}"'
+    return header
+
+
+def _authorization(host: str, uri: str, username: str, password: str):
+    """Return the Authorization header for the scheme the host accepted last time, if any."""
+    scheme = _auth_schemes.get(host)
+    if scheme == AUTH_BASIC:
+        return aiohttp.BasicAuth(username, password).encode()
+    if scheme == AUTH_DIGEST and host in _digest_challenges:
+        return _digest_authorization(_digest_challenges[host], uri, username, password)
+    return None
+
+
+def _if_modified_since(configuration) -> dict:
+    """Conditional request headers derived from the 'timestamp' of a cached configuration."""
+    try:
+        return {"If-Modified-Since": formatdate(float(configuration["timestamp"]), usegmt=True)}
+    except (KeyError, TypeError, ValueError):
+        return {}
+
+
+async def async_get_mlgw_configuration(
+    hass: HomeAssistant, host: str, username: str, password: str, known=None
+):
+    """Get the configuration data from the mlgw using the mlgwpservices.json endpoint.
+
+    Returns the configuration as a dict, or None if the gateway did not return it.
+    If the configuration did not change since the last fetch (HTTP 304, or same
+    'timestamp' field), the previously returned dict is returned. known is a configuration
+    obtained elsewhere (e.g. stored), used for the conditional request on the first fetch.
+    Raises MLGWAuthenticationError if the credentials are refused, and aiohttp.ClientError
+    or TimeoutError if the gateway cannot be reached.
+    """
+    session = async_get_clientsession(hass)
+    url = BASE_URL.format(host, MLGW_CONFIG_JSON_PATH)
+    uri = f"/{MLGW_CONFIG_JSON_PATH}"
+    cached = _configurations.get(host, known)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+
+    # At most: a request with a remembered scheme, one answering a fresh challenge and one
+    # falling back to the other scheme.
+    fresh_challenge = False  # a Digest challenge was received during this call
+    for _ in range(3):
+        headers = _if_modified_since(cached) if cached is not None else {}
+        sent_scheme = None
+        sent_fresh = fresh_challenge
+        authorization = _authorization(host, uri, username, password)
+        if authorization is not None:
+            headers["Authorization"] = authorization
+            sent_scheme = _auth_schemes[host]
+
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 401:
+                challenge = response.headers.get("WWW-Authenticate", "")
+                if challenge.lower().startswith("digest"):
+                    params = _parse_challenge(challenge)
+                    # a refused answer to a challenge remembered from an earlier call may
+                    # just be an expired nonce (the MLGW doesn't say stale=true): only
+                    # the refusal of an answer to this call's challenge is final
+                    if (
+                        sent_scheme == AUTH_DIGEST
+                        and sent_fresh
+                        and params.get("stale", "").lower() != "true"
+                    ):
+                        break
+                    _auth_schemes[host] = AUTH_DIGEST
+                    _digest_challenges[host] = params
+                    fresh_challenge = True
+                elif sent_scheme == AUTH_BASIC:
+                    break
+                else:
+                    _auth_schemes[host] = AUTH_BASIC
+                continue
+            if response.status == 304 and cached is not None:
+                _LOGGER.debug("MLGW configuration not modified on %s", host)
+                return cached
+            if response.status != 200:
+                _LOGGER.warning(
+                    "MLGW configuration request to %s returned %s",
+                    host,
+                    response.status,
+                )
+                return None
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                _LOGGER.warning("MLGW configuration from %s is not valid", host)
+                return None
+
+        if cached is not None and data.get("timestamp") == cached.get("timestamp"):
+            return cached
+        _configurations[host] = data
+        return data
+
+    _auth_schemes.pop(host, None)
+    _digest_challenges.pop(host, None)
+    _LOGGER.warning("Invalid authentication to MLGW %s", host)
+    raise MLGWAuthenticationError
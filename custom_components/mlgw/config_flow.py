@@ -10,20 +10,35 @@ import re
 import socket
 import xml.etree.ElementTree as ET
 
-import requests
-from requests.auth import HTTPBasicAuth, HTTPDigestAuth
-from requests.exceptions import ConnectTimeout
+import aiohttp
 import voluptuous as vol
 
 from homeassistant import config_entries, core, data_entry_flow, exceptions
 from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
 
+from .api import MLGWAuthenticationError, async_get_mlgw_configuration
 from .const import (
-    BASE_URL,
+    CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    CONF_ML_EVENT_FROM_DEVICES,
+    CONF_ML_EVENT_PAYLOAD_TYPES,
+    CONF_ML_EVENT_TO_DEVICES,
+    CONF_ML_EVENT_TYPES,
+    CONF_MLGW_CAPTURE,
+    CONF_MLGW_CAPTURE_MAX_SIZE,
+    CONF_MLGW_PING_INTERVAL,
+    CONF_MLGW_PONG_TIMEOUT,
     CONF_MLGW_USE_MLLOG,
+    DEFAULT_CAPTURE_MAX_SIZE,
+    DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    DEFAULT_PING_INTERVAL,
+    DEFAULT_PONG_TIMEOUT,
     DOMAIN,
-    MLGW_CONFIG_JSON_PATH,
+    MLGW_GATEWAY,
     TIMEOUT,
+    ml_command_type_dict,
+    ml_telegram_type_dict,
 )  # pylint:disable=unused-import
 
 _LOGGER = logging.getLogger(__name__)
@@ -114,6 +129,16 @@ async def mlgw_get_xmpp_serial(_host: str) -> str:
     return sn
 
 
+def _wake_configured_gateway(hass: core.HomeAssistant, sn):
+    """A configured gateway announced itself on the network: reconnect now if it is down."""
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.unique_id != sn:
+            continue
+        gateway = hass.data.get(DOMAIN, {}).get(entry.entry_id, {}).get(MLGW_GATEWAY)
+        if gateway is not None:
+            gateway.reconnect_now()
+
+
 class CheckPasswordMLGWHub:
     """Checks Password for the MLGW Hub and gets basic information."""
 
@@ -122,31 +147,19 @@ class CheckPasswordMLGWHub:
         self._host = host
         self._data = None
 
-    def authenticate(self, user, password) -> bool:
+    async def authenticate(self, hass: core.HomeAssistant, user, password) -> bool:
         """Test if we can authenticate with the host."""
-        # try Digest Auth first (this is needed for the MLGW)
-        response = requests.get(
-            BASE_URL.format(self._host, MLGW_CONFIG_JSON_PATH),
-            timeout=TIMEOUT,
-            auth=HTTPDigestAuth(user, password),
-        )
-        # try Basic Auth next (this is needed for the BLGW)
-        if response.status_code == 401:
-            response = requests.get(
-                BASE_URL.format(self._host, MLGW_CONFIG_JSON_PATH),
-                timeout=TIMEOUT,
-                auth=HTTPBasicAuth(user, password),
+        # the MLGW needs Digest Auth, the BLGW Basic Auth: the client tries both
+        try:
+            self._data = await async_get_mlgw_configuration(
+                hass, self._host, user, password
             )
+        except MLGWAuthenticationError as ex:
+            raise InvalidAuth from ex
+        except (aiohttp.ClientError, TimeoutError) as ex:
+            raise CannotConnect from ex
 
-        if response.status_code == 401:
-            _LOGGER.warning("Invalid authentication to MLGW")
-            raise InvalidAuth
-
-        if response.status_code != 200:
-            return False
-
-        self._data = response.json()
-        return True
+        return self._data is not None
 
 
 async def validate_input(hass: core.HomeAssistant, data):
@@ -164,11 +177,8 @@ async def validate_input(hass: core.HomeAssistant, data):
 
     hub = CheckPasswordMLGWHub(data[CONF_HOST])
 
-    #    if not await hub.authenticate(data[CONF_USERNAME],data[CONF_PASSWORD]):
-    #        raise InvalidAuth
-    await hass.async_add_executor_job(
-        hub.authenticate, data[CONF_USERNAME], data[CONF_PASSWORD]
-    )
+    if not await hub.authenticate(hass, data[CONF_USERNAME], data[CONF_PASSWORD]):
+        raise CannotConnect
 
     # If you cannot connect throw CannotConnect
     # If the authentication is wrong throw InvalidAuth
@@ -188,6 +198,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize."""
         self.host = None
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
         _LOGGER.debug("Async Step User Config Flow called")
@@ -206,8 +222,6 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             info = await validate_input(self.hass, user_input)
         except CannotConnect:
             errors["base"] = "cannot_connect"
-        except ConnectTimeout:
-            errors["base"] = "cannot_connect"
         except InvalidAuth:
             errors["base"] = "invalid_auth"
         except InvalidHost:
@@ -255,6 +269,7 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             return self.async_abort(reason="cannot_connect")
         if sn is not None:
             await self.async_set_unique_id(sn)
+            _wake_configured_gateway(self.hass, sn)
             self._abort_if_unique_id_configured()
         if sn is None:
             raise data_entry_flow.AbortFlow("no_serial_number")
@@ -307,6 +322,88 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         )
 
 
+# Well known ML device addresses that can be used in the ML event filter
+ML_EVENT_DEVICES = [
+    "VIDEO_MASTER",
+    "AUDIO_MASTER",
+    "SOURCE_CENTER",
+    "ALL_AUDIO_LINK_DEVICES",
+    "ALL_VIDEO_LINK_DEVICES",
+    "ALL_LINK_DEVICES",
+    "ALL",
+    "MLGW",
+]
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the options for MasterLink Gateway (ML telegrams fired as events, keepalive, capture)."""
+
+    def __init__(self, config_entry) -> None:
+        """Initialize."""
+        self._entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the ML event filter, the keepalive and the capture."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self._entry.options
+        payload_types = sorted(ml_command_type_dict.values())
+        telegram_types = sorted(ml_telegram_type_dict.values())
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(
+                        CONF_ML_EVENT_PAYLOAD_TYPES,
+                        default=options.get(CONF_ML_EVENT_PAYLOAD_TYPES, []),
+                    ): cv.multi_select(payload_types),
+                    vol.Optional(
+                        CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+                        default=options.get(
+                            CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+                            DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+                        ),
+                    ): cv.multi_select(payload_types),
+                    vol.Optional(
+                        CONF_ML_EVENT_TYPES,
+                        default=options.get(CONF_ML_EVENT_TYPES, []),
+                    ): cv.multi_select(telegram_types),
+                    vol.Optional(
+                        CONF_ML_EVENT_FROM_DEVICES,
+                        default=options.get(CONF_ML_EVENT_FROM_DEVICES, []),
+                    ): cv.multi_select(ML_EVENT_DEVICES),
+                    vol.Optional(
+                        CONF_ML_EVENT_TO_DEVICES,
+                        default=options.get(CONF_ML_EVENT_TO_DEVICES, []),
+                    ): cv.multi_select(ML_EVENT_DEVICES),
+                    vol.Optional(
+                        CONF_MLGW_PING_INTERVAL,
+                        default=options.get(
+                            CONF_MLGW_PING_INTERVAL, DEFAULT_PING_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=5, max=600)),
+                    vol.Optional(
+                        CONF_MLGW_PONG_TIMEOUT,
+                        default=options.get(
+                            CONF_MLGW_PONG_TIMEOUT, DEFAULT_PONG_TIMEOUT
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+                    vol.Optional(
+                        CONF_MLGW_CAPTURE,
+                        default=options.get(CONF_MLGW_CAPTURE, False),
+                    ): bool,
+                    vol.Optional(
+                        CONF_MLGW_CAPTURE_MAX_SIZE,
+                        default=options.get(
+                            CONF_MLGW_CAPTURE_MAX_SIZE, DEFAULT_CAPTURE_MAX_SIZE
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+                }
+            ),
+        )
+
+
 class CannotConnect(exceptions.HomeAssistantError):
     """Error to indicate we cannot connect."""
 
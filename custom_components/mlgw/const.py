@@ -17,12 +17,26 @@ DOMAIN = "mlgw"
 MLGW_GATEWAY = "MLGW_GATEWAY"
 MLGW_DEVICES = "MLGW_DEVICES"
 MLGW_GATEWAY_CONFIGURATION_DATA = "MLGW_GATEWAY_CONFIG_DATA"
+MLGW_STORE = "MLGW_STORE"
+
+# ##### Storage of the last good configuration and of the learned ML addresses
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.{{}}"  # formatted with the config entry id
+STORAGE_SAVE_DELAY = 10
 
 # ##### Requests data
 BASE_URL = "http://{0}/{1}"
 MLGW_CONFIG_JSON_PATH = "mlgwpservices.json"
 TIMEOUT = 5.0
-ML_ID_TIMEOUT = 5           # the number of seconds we wait to get back all the ML IDs. 
+ML_ID_TIMEOUT = 1.0         # the number of seconds we wait for a device to report its ML ID.
+ML_ID_RETRY_DELAY = 30      # the first retry for the devices that did not report, doubled up to
+ML_ID_RETRY_MAX_DELAY = 3600  # this many seconds.
+RECONNECT_MIN_DELAY = 0.5   # seconds before the first reconnection attempt, doubled on every
+RECONNECT_MAX_DELAY = 60    # failure up to this many seconds.
+MLGW_SEND_QUEUE_SIZE = 64   # commands waiting to be sent to the MLGW (e.g. while reconnecting)
+MLGW_SEND_MAX_AGE = 30      # seconds after which a queued command is not worth sending anymore
+CHANNEL_SOURCE_DELAY = 1000  # milliseconds for a source to come on before dialling a channel,
+CHANNEL_DIGIT_DELAY = 100    # and between the digits of a channel number.
 
 # ########################################################################################
 # ##### Events
@@ -48,12 +62,58 @@ CONF_MLGW_DEVICE_MLID = "id"
 # if you decide to use it, then Username must be 'admin' and password must be the admin password.
 CONF_MLGW_USE_MLLOG = "use_mllog"
 
+# Filter for the ML telegrams fired as mlgw.ML_telegram events. Each option is a list of
+# accepted values for the corresponding telegram field (empty means any value).
+# All the telegrams are fired unless configured otherwise, the chatter that is constantly
+# on the bus (CLOCK, MASTER_PRESENT, LOCK_MANAGER_COMMAND) can be excluded.
+CONF_ML_EVENT_PAYLOAD_TYPES = "ml_event_payload_types"
+CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES = "ml_event_exclude_payload_types"
+CONF_ML_EVENT_TYPES = "ml_event_types"
+CONF_ML_EVENT_FROM_DEVICES = "ml_event_from_devices"
+CONF_ML_EVENT_TO_DEVICES = "ml_event_to_devices"
+DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES = []
+ML_EVENT_FILTER_OPTIONS = [
+    CONF_ML_EVENT_PAYLOAD_TYPES,
+    CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    CONF_ML_EVENT_TYPES,
+    CONF_ML_EVENT_FROM_DEVICES,
+    CONF_ML_EVENT_TO_DEVICES,
+]
+
+# Keepalive of the MLGW (port 9000) connection: ping after this many seconds without
+# receiving anything, and consider the connection dead if nothing comes back in time.
+CONF_MLGW_PING_INTERVAL = "ping_interval"
+CONF_MLGW_PONG_TIMEOUT = "pong_timeout"
+DEFAULT_PING_INTERVAL = 30
+DEFAULT_PONG_TIMEOUT = 10
+
+# Capture of the traffic received from the gateway into a rotating journal in the config
+# directory (see journal.py), to replay it later.
+CONF_MLGW_CAPTURE = "capture"
+CONF_MLGW_CAPTURE_MAX_SIZE = "capture_max_size"
+DEFAULT_CAPTURE_MAX_SIZE = 10  # MB, for each of the rotated files
+CAPTURE_FILE = "mlgw_capture_{}.bin"
+JOURNAL_BACKUP_COUNT = 3
+JOURNAL_FLUSH_INTERVAL = 1.0  # seconds
+JOURNAL_MAX_BUFFER = 1 << 20  # bytes waiting to be written, records are dropped beyond
+LINK_MLGW = 0x01  # a telegram of the MLGW protocol (port 9000)
+LINK_ML = 0x02  # a line of the ML CLI log
+
+# Diagnostic sensors of the traffic with the gateway (see stats.py and sensor.py)
+STATS_UPDATE_INTERVAL = 30  # seconds, the rates are averaged over this interval
+
 
 # ########################################################################################
 # ##### Services
 
 ATTR_MLGW_BUTTON = "button"
 ATTR_MLGW_ACTION = "action"
+ATTR_MLGW_DURATION = "duration"
+
+# Profiling of the integration, started by the start_profiling service (see profiling.py)
+PROFILE_FILE = "mlgw_profile_{}"
+DEFAULT_PROFILE_DURATION = 60  # seconds
+MAX_PROFILE_DURATION = 3600
 
 
 # ########################################################################################
@@ -0,0 +1,53 @@
+"""Diagnostics of the MasterLink Gateway: configuration, connections and traffic statistics."""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, MLGW_GATEWAY
+from .gateway import MasterLinkGateway
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return the diagnostics of a config entry."""
+    gateway: MasterLinkGateway = hass.data[DOMAIN][entry.entry_id][MLGW_GATEWAY]
+    journal = gateway.journal
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "gateway": {
+            "serial": gateway.serial,
+            "mlgw_connected": gateway.connectedMLGW,
+            "ml_connected": gateway.connectedML,
+            "use_mllog": gateway.use_mllog,
+            "ping_rtt_ms": None if gateway.ping_rtt is None else gateway.ping_rtt * 1000,
+            "send_queue_depth": gateway.send_queue_depth,
+            "discarded_bytes": gateway.discarded_bytes,
+            "beolink_source": gateway.beolink_source,
+        },
+        "capture": None
+        if journal is None
+        else {
+            "path": journal.path,
+            "max_bytes": journal.max_bytes,
+            "records": journal.records,
+            "dropped": journal.dropped,
+        },
+        "statistics": gateway.stats.as_dict(),
+        "devices": [
+            {
+                "name": device.name,
+                "mln": device.mln,
+                "ml": device.ml,
+                "entity_id": device.entity_id,
+            }
+            for device in gateway.devices or ()
+        ],
+    }
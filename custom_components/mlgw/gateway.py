@@ -3,6 +3,7 @@
 import asyncio
 from datetime import datetime
 import logging
+import random
 import socket
 import threading
 import time
@@ -13,9 +14,30 @@ from homeassistant.const import EVENT_HOMEASSISTANT_STOP, STATE_OFF, STATE_PLAYI
 from homeassistant.core import HomeAssistant, callback
 
 from .const import (
+    BEO4_CMDS,
+    CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    CONF_ML_EVENT_FROM_DEVICES,
+    CONF_ML_EVENT_PAYLOAD_TYPES,
+    CONF_ML_EVENT_TO_DEVICES,
+    CONF_ML_EVENT_TYPES,
+    CONF_MLGW_PING_INTERVAL,
+    CONF_MLGW_PONG_TIMEOUT,
+    DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES,
+    DEFAULT_PING_INTERVAL,
+    DEFAULT_PONG_TIMEOUT,
+    DOMAIN,
+    LINK_ML,
+    LINK_MLGW,
     MLGW_EVENT_ML_TELEGRAM,
     MLGW_EVENT_MLGW_TELEGRAM,
+    ML_ID_TIMEOUT,
     MLGW_PL,
+    MLGW_SEND_MAX_AGE,
+    MLGW_SEND_QUEUE_SIZE,
+    MLGW_STORE,
+    RECONNECT_MAX_DELAY,
+    RECONNECT_MIN_DELAY,
+    TIMEOUT,
     beo4_commanddict,
     ml_command_type_dict,
     ml_destselectordict,
@@ -34,10 +56,212 @@ from .const import (
     mlgw_speakermodedict,
     mlgw_stereoindicatordict,
     mlgw_virtualactiondict,
+    reverse_ml_destselectordict,
 )
+from .stats import MLGWStats
 
 _LOGGER = logging.getLogger(__name__)
 
+# ML telegrams sent by the audio master that every device needs to see
+_ML_AUDIO_MASTER_BROADCASTS = ("DISPLAY_SOURCE", "EXTENDED_SOURCE_INFORMATION")
+
+MLGW_SOH = 0x01  # every MLGW telegram starts with Start Of Header
+# login request, ping, request serial number: part of setting up the connection, so they
+# are sent right away instead of waiting in the queue for the login
+_MLGW_SESSION_TYPES = frozenset((0x30, 0x36, 0x39))
+MLGW_HEADER_LEN = 4  # SOH, payload type, payload length, spare
+
+
+class MLGWFramer:
+    """Split the MLGW port 9000 byte stream into telegrams.
+
+    TCP does not preserve message boundaries: one recv() can carry several
+    telegrams, or only part of one. Bytes are accumulated in a reusable buffer
+    and complete telegrams (header + payload) are handed out as memoryview
+    slices of that buffer, without copying. A frame is only valid until the
+    consumer asks for the next one; use bytes(frame) to keep it longer.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty framer."""
+        self._buffer = bytearray()
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        """Return the number of buffered bytes not yet returned as frames."""
+        return len(self._buffer)
+
+    def clear(self):
+        """Discard any buffered data (e.g. after a reconnection)."""
+        self._buffer.clear()
+
+    def feed(self, data):
+        """Append received bytes to the buffer."""
+        self._buffer += data
+
+    def frames(self):
+        """Yield every complete telegram currently in the buffer as a memoryview.
+
+        Bytes that cannot be the start of a telegram are skipped until the next
+        SOH, so the stream resynchronizes by itself after garbage. Incomplete
+        telegrams stay in the buffer until more data is fed.
+        """
+        buffer = self._buffer
+        view = memoryview(buffer)
+        start = 0
+        end = len(buffer)
+        try:
+            while end - start >= MLGW_HEADER_LEN:
+                if buffer[start] != MLGW_SOH:
+                    soh = buffer.find(MLGW_SOH, start + 1)
+                    skip_to = end if soh < 0 else soh
+                    self.dropped_bytes += skip_to - start
+                    _LOGGER.debug(
+                        "MLGW: skipped %d bytes without SOH", skip_to - start
+                    )
+                    start = skip_to
+                    continue
+                size = MLGW_HEADER_LEN + buffer[start + 2]
+                if end - start < size:
+                    break
+                frame = view[start : start + size]
+                start += size
+                try:
+                    yield frame
+                finally:
+                    frame.release()
+        finally:
+            view.release()
+            if start:
+                try:
+                    del buffer[:start]
+                except BufferError:
+                    # a consumer kept a view on the buffer: leave it alone
+                    self._buffer = buffer[start:]
+
+
+class MLLineBuffer:
+    """Split the ML CLI byte stream into lines.
+
+    Bytes are accumulated in a reusable buffer and complete lines are returned
+    without the line terminator.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty line buffer."""
+        self._buffer = bytearray()
+
+    def clear(self):
+        """Discard any buffered data (e.g. after a reconnection)."""
+        self._buffer.clear()
+
+    def feed(self, data):
+        """Append received bytes to the buffer."""
+        self._buffer += data
+
+    def lines(self):
+        """Yield every complete line currently in the buffer."""
+        buffer = self._buffer
+        start = 0
+        try:
+            while (eol := buffer.find(b"\n", start)) >= 0:
+                line = bytes(buffer[start:eol])
+                start = eol + 1
+                yield line
+        finally:
+            if start:
+                del buffer[:start]
+
+
+class ReconnectBackoff:
+    """Delays between the reconnection attempts of a link.
+
+    The delay doubles after every failed attempt, from min_delay up to max_delay, with
+    random jitter so that several links don't retry in lockstep. reset() after a
+    successful connection, wake() to cut the current wait short (e.g. the network is back).
+    """
+
+    def __init__(self, min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY):
+        """Initialize the backoff."""
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._delay = min_delay
+        self._woken = asyncio.Event()
+
+    def reset(self):
+        """Start again from the shortest delay."""
+        self._delay = self._min_delay
+
+    def wake(self):
+        """Stop the current wait, and start again from the shortest delay."""
+        self.reset()
+        self._woken.set()
+
+    def next_delay(self) -> float:
+        """Return the delay before the next attempt, and double it for the one after."""
+        delay = self._delay
+        self._delay = min(self._delay * 2, self._max_delay)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def wait(self):
+        """Wait before the next attempt, or until wake() is called."""
+        self._woken.clear()
+        try:
+            await asyncio.wait_for(self._woken.wait(), self.next_delay())
+        except TimeoutError:
+            pass
+
+
+class MLGWProtocol(asyncio.Protocol):
+    """asyncio protocol for the MLGW port 9000 connection.
+
+    Runs on the Home Assistant event loop and hands every complete telegram to the gateway.
+    """
+
+    def __init__(self, gateway) -> None:
+        """Initialize the protocol for a gateway."""
+        self._gateway = gateway
+        self.disconnected = asyncio.get_running_loop().create_future()
+        # cleared while the transport's write buffer is above its high-water mark
+        self.can_write = asyncio.Event()
+        self.can_write.set()
+
+    def connection_made(self, transport):
+        """Reset the framer when a new connection is established."""
+        self._gateway._framer.clear()
+
+    def data_received(self, data):
+        """Split the received bytes into telegrams and process them."""
+        gateway = self._gateway
+        received = gateway._mlgw_last_received = gateway._hass.loop.time()
+        journal = gateway.journal
+        framer = gateway._framer
+        framer.feed(data)
+        for telegram in framer.frames():
+            if journal is not None:
+                journal.record(LINK_MLGW, telegram, received)
+            gateway._mlgw_process(telegram)
+
+    def pause_writing(self):
+        """Hold the queued commands until the transport's buffer drains."""
+        self.can_write.clear()
+
+    def resume_writing(self):
+        """Let the queued commands through again."""
+        self.can_write.set()
+
+    def connection_lost(self, exc):
+        """Signal the connection manager that the connection has gone away."""
+        if exc is not None:
+            _LOGGER.warning("MLGW: connection lost: %s", exc)
+        # hold the queued commands until the connection is back, and don't leave the
+        # writer waiting for this connection to drain
+        self._gateway.mlgw_logged_in.clear()
+        self.can_write.set()
+        self._gateway._mlgw_fail_pending()
+        if not self.disconnected.done():
+            self.disconnected.set_result(None)
+
 
 class MasterLinkGateway:
     """Masterlink gateway to interact with a MasterLink Gateway http://mlgw.bang-olufsen.dk/source/documents/mlgw_2.24b/MlgwProto0240.pdf ."""
@@ -57,6 +281,7 @@ class MasterLinkGateway:
         available_sources,
         hass: HomeAssistant,
         config_entry_id=None,
+        ml_event_filter=None,
     ) -> None:
         """Initialize the MLGW gateway."""
         # for both connections
@@ -65,37 +290,100 @@ class MasterLinkGateway:
         self._password = password
         # for the ML (Telnet CLI) connection
         self._use_mllog = use_mllog
-        self._connectedML = False
+        self.ml_connected = asyncio.Event()
         self._tn = None
+        self._ml_event_filter = compile_ml_event_filter(ml_event_filter or {})
+        self._ml_telegram_listeners = []
+        # records the traffic received on both connections, if capturing (journal.py)
+        self.journal = None
+        # counters and latencies of the traffic on both connections (stats.py)
+        self.stats = MLGWStats()
+        # profiles the handling of the traffic, while profiling (profiling.py)
+        self.profiler = None
+        self._ml_probe_lock = asyncio.Lock()
+        # loop time until which a late reply to a probe that timed out may still come
+        self._ml_probe_quiet_until = 0.0
+        self._ml_backoff = ReconnectBackoff()
         # for the MLGW (Port 9000) connection
         self._port = port
-        self._socket = None
-        self.buffersize = 1024
-        self._connectedMLGW = False
-        self.stopped = threading.Event()
-        self.brokensocket = threading.Event()
-        self.stopped.clear()
-        self.brokensocket.clear()
+        self._transport: asyncio.Transport = None
+        self._protocol: MLGWProtocol = None
+        self._framer = MLGWFramer()
+        self.stopped = asyncio.Event()
+        self._mlgw_backoff = ReconnectBackoff()
+        # keepalive: loop time of the last data received and of the outstanding ping
+        self._ping_interval = DEFAULT_PING_INTERVAL
+        self._pong_timeout = DEFAULT_PONG_TIMEOUT
+        self._mlgw_last_received = 0.0
+        self.ping_rtt = None  # round trip time of the last ping, in seconds
+        # futures waiting for a reply from the MLGW, keyed by the expected payload type
+        self._mlgw_pending = {}
+        # readiness of the MLGW connection: connected, logged in (or no login needed, then
+        # commands can be sent). The serial number is in serial once it is received.
+        self.mlgw_connected = asyncio.Event()
+        self.mlgw_logged_in = asyncio.Event()
+        self._mlgw_login_requested = False
+        # commands to the MLGW, sent in order by _mlgw_writer when the MLGW is ready
+        self._send_queue = asyncio.Queue(MLGW_SEND_QUEUE_SIZE)
+        self._sequence_lock = asyncio.Lock()
+        self._tasks = []
 
         # to manage the sources and devices
         self._default_source = default_source
         self._beolink_source = default_source
         self._available_sources = available_sources
         self._devices = None
+        self._devices_by_mln = {}
+        self._devices_by_ml = {}
         self._hass: HomeAssistant = hass
         self._config_entry_id = config_entry_id
         self._serial = None
         self._mlgw_configurationdata = mlgw_configurationdata
+        self._room_names = {}
+        if mlgw_configurationdata:
+            self._room_names = {
+                zone["number"]: zone["name"]
+                for zone in mlgw_configurationdata["zones"]
+                if "name" in zone
+            }
+
+        # Handlers for the MLGW payload types, keyed by the payload type byte.
+        self._mlgw_handlers = {
+            0x02: self._mlgw_source_status,
+            0x03: self._mlgw_pict_sound_status,
+            0x04: self._mlgw_light_control,
+            0x05: self._mlgw_all_standby,
+            0x20: self._mlgw_virtual_button,
+            0x31: self._mlgw_login_status,
+            0x37: self._mlgw_pong,
+            0x38: self._mlgw_configuration_changed,
+            0x3A: self._mlgw_serial_number,
+        }
 
     @property
     def connectedMLGW(self):
         """True if the MLGW is connected."""
-        return self._connectedMLGW
+        return self.mlgw_connected.is_set()
 
     @property
     def connectedML(self):
         """True if the ML CLI is connected."""
-        return self._connectedML
+        return self.ml_connected.is_set()
+
+    @property
+    def serial(self):
+        """The serial number reported by the MLGW, or None until it is received."""
+        return self._serial
+
+    @property
+    def send_queue_depth(self):
+        """The number of commands waiting to be sent to the MLGW."""
+        return self._send_queue.qsize()
+
+    @property
+    def discarded_bytes(self):
+        """The bytes received from the MLGW that were not part of a telegram."""
+        return self._framer.dropped_bytes
 
     @property
     def devices(self):
@@ -125,13 +413,94 @@ class MasterLinkGateway:
     def set_devices(self, devices):
         """Set the list of devices configured on the gateway."""
         self._devices = devices
+        self._devices_by_mln = {x.mln: x for x in devices}
+        self._devices_by_ml = {x.ml: x for x in devices if x.ml is not None}
+
+    def device_ml_changed(self, device, old_ml):
+        """Update the ML address index when the ML address of a device is learned or changes."""
+        if old_ml is not None and self._devices_by_ml.get(old_ml) is device:
+            del self._devices_by_ml[old_ml]
+        if device.ml is not None:
+            stale = self._devices_by_ml.get(device.ml)
+            if stale is not None and stale is not device:
+                # the address was learned again for this device, the other one moved
+                _LOGGER.info(
+                    "ML: %s is now MLN %s, was MLN %s", device.ml, device.mln, stale.mln
+                )
+                stale.set_ml(None)
+            self._devices_by_ml[device.ml] = device
+
+    def set_ml_event_filter(self, ml_event_filter):
+        """Set which ML telegrams are fired as events on the Home Assistant bus.
+
+        ml_event_filter: a mapping with the ML event filter options (e.g. the config entry options).
+        """
+        self._ml_event_filter = compile_ml_event_filter(ml_event_filter)
+
+    def set_keepalive(self, options):
+        """Set the keepalive of the MLGW connection.
+
+        options: a mapping with the ping interval and pong timeout in seconds (e.g. the config
+        entry options).
+        """
+        self._ping_interval = options.get(CONF_MLGW_PING_INTERVAL, DEFAULT_PING_INTERVAL)
+        self._pong_timeout = options.get(CONF_MLGW_PONG_TIMEOUT, DEFAULT_PONG_TIMEOUT)
+
+    @callback
+    def add_ml_telegram_listener(self, listener):
+        """Call listener(telegram) for every decoded ML telegram, regardless of the event filter.
+
+        Returns a function that removes the listener.
+        """
+        self._ml_telegram_listeners.append(listener)
+
+        @callback
+        def _remove_listener():
+            self._ml_telegram_listeners.remove(listener)
+
+        return _remove_listener
+
+    def device_by_mln(self, mln):
+        """Return the device with the given MLN, or None."""
+        return self._devices_by_mln.get(mln)
+
+    def device_by_ml(self, ml):
+        """Return the device with the given ML address (e.g. 'AUDIO_MASTER'), or None."""
+        return self._devices_by_ml.get(ml)
+
+    def reconnect_now(self):
+        """Retry the disconnected links right away (e.g. the gateway announced itself again)."""
+        self._mlgw_backoff.wake()
+        self._ml_backoff.wake()
+
+    def async_create_task(self, coro):
+        """Run a coroutine in a task that is cancelled when the gateway terminates."""
+        task = self._hass.loop.create_task(coro)
+        self._tasks.append(task)
+        return task
 
     async def terminate_async(self):
         """Terminate the gateway connections.
 
-        Sets a flag that the listen threads look at to determine when to quit.
+        Sets the stop flag, closes both connections, cancels the connection tasks and the
+        commands still waiting to be sent, closes the capture journal and ends a profile.
         """
         self.stopped.set()
+        self.mlgw_close()
+        self.ml_close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        while not self._send_queue.empty():
+            _, _, sent = self._send_queue.get_nowait()
+            if sent is not None:
+                sent.cancel()
+        if self.journal is not None:
+            journal, self.journal = self.journal, None
+            await journal.async_close()
+        if self.profiler is not None:
+            await self.profiler.async_stop()
 
     # The following functions are used to read the events ML Gateway on the undocumented backdoor.
 
@@ -144,7 +513,7 @@ class MasterLinkGateway:
         self._reader, self._writer = await telnetlib3.open_connection(self._host)
 
         _LOGGER.debug("Attempt to connect to ML CLI: %s", self._host)
-        self._connectedML = False
+        self.ml_connected.clear()
 
         try:
             line = await asyncio.wait_for(self._reader.readuntil(b"login: "), timeout=2)
@@ -176,7 +545,7 @@ class MasterLinkGateway:
             # Enter the undocumented Masterlink Logging function
             self._writer.write("_MLLOG ONLINE\r\n")
 
-            self._connectedML = True
+            self.ml_connected.set()
             _LOGGER.debug("Connected to ML CLI: %s", self._host)
 
         except EOFError as exc:
@@ -187,42 +556,44 @@ class MasterLinkGateway:
             _LOGGER.warning("Failed to connect to ML CLI: %s", exc)
             raise
 
+        finally:
+            if not self.ml_connected.is_set():
+                # login failed, timed out or was cancelled: don't leave the socket and a
+                # CLI session on the gateway open
+                self.ml_close()
+
     def ml_close(self):
-        """Close the connection to the MasterLink stream."""
-        if self._connectedML:
-            self._connectedML = False
+        """Close the connection to the MasterLink stream, connected or not."""
+        self.ml_connected.clear()
+        if self._writer is not None:
             try:
                 self._writer.close()
                 self._reader.close()
             except OSError:
                 _LOGGER.error("Error closing ML CLI")
+            self._writer = None
+            self._reader = None
             _LOGGER.debug("Closed connection to ML CLI")
 
     # This is the thread function to manage the ML CLI connection
     async def ml_thread(self):
-        """Manage the connection with the MLGW API."""
-        connect_retries = 0
-        max_connect_retries = 10
-        retry_delay = 60
-        while connect_retries < max_connect_retries and not self.stopped.is_set():
+        """Manage the connection with the ML CLI, reconnecting until the gateway stops."""
+        while not self.stopped.is_set():
             try:
                 # if not connected, then connect
-                if not self._connectedML:
+                if not self.ml_connected.is_set():
                     await self.async_ml_connect()
-            except (ConnectionError, OSError):
-                # wait for 1 minute, max 10 times
-                await asyncio.sleep(retry_delay)
-                connect_retries = connect_retries + 1
+            except (OSError, EOFError):
+                await self._ml_backoff.wait()
                 continue
+            self._ml_backoff.reset()  # if connect was successful, reset the delay
             try:
-                connect_retries = 0  # if connect was successful, reset the attempts
                 await self.ml_listen()
                 self.ml_close()
             except (ConnectionResetError, OSError, EOFError):
                 self.ml_close()
-                # wait for 1 minute, max 10 times
-                await asyncio.sleep(retry_delay)
-                connect_retries = connect_retries + 1
+                self.stats.reconnects[LINK_ML] += 1
+                await self._ml_backoff.wait()
                 continue
             except KeyboardInterrupt:
                 break
@@ -233,67 +604,19 @@ class MasterLinkGateway:
         _recvtimeout = 5  # timeout recv every 5 sec
         _lastping = 0  # how many seconds ago was the last ping.
 
-        input_bytes = ""
+        linebuffer = MLLineBuffer()
         while not self.stopped.is_set():
             try:  # nonblocking read from the connection
                 data = await asyncio.wait_for(
                     self._reader.readuntil(b"\n"), _recvtimeout
                 )
-                input_bytes = input_bytes + data.decode("ascii")
+                linebuffer.feed(data)
             except asyncio.exceptions.CancelledError as e:
+                if self.stopped.is_set():
+                    raise
                 _LOGGER.error("Failed with: {%s}", e)
                 continue
             except asyncio.exceptions.TimeoutError:
-                continue
-            except EOFError:
-                _LOGGER.error("ML CLI Thread: EOF Error")
-                self.ml_close()
-                raise
-
-            if input_bytes.find("\n") > 0:  # if there is a full line
-                line = input_bytes[0 : input_bytes.find("\n")]
-                input_bytes = input_bytes[input_bytes.find("\n") + 1 :]
-
-                items = line.split()
-                try:
-                    date_time_obj = datetime.strptime(items[0], "%Y%m%d-%H:%M:%S:%f:")
-                    telegram = bytearray()
-
-                    for x in range(1, len(items)):
-                        telegram.append(int(items[x][:-1], base=16))
-
-                    encoded_telegram = decode_ml_to_dict(telegram)
-                    encoded_telegram["timestamp"] = date_time_obj.isoformat()
-                    encoded_telegram["bytes"] = "".join(f"{x:02x}" for x in telegram)
-
-                    # try to find the mln of the from_device and to_device
-                    if self._devices is not None:
-                        for x in self._devices:
-                            if x._ml == encoded_telegram["from_device"]:
-                                encoded_telegram["from_mln"] = x._mln
-                                encoded_telegram["from_name"] = x.name
-                                encoded_telegram["from_entity_id"] = x.entity_id
-                            if x._ml == encoded_telegram["to_device"]:
-                                encoded_telegram["to_mln"] = x._mln
-                                encoded_telegram["to_name"] = x.name
-                                encoded_telegram["to_entity_id"] = x.entity_id
-                    # if a GOTO Source telegram is received, set the beolink source to it
-                    # this only tracks the primary beolink source, doesn't track local sources
-                    if encoded_telegram["payload_type"] == "GOTO_SOURCE":
-                        self._beolink_source = encoded_telegram["payload"]["source"]
-
-                    _LOGGER.info("ML: %s", encoded_telegram)
-
-                    self._hass.add_job(
-                        self._notify_incoming_ML_telegram, encoded_telegram
-                    )
-                except ValueError:
-                    continue
-                except IndexError:
-                    _LOGGER.error("ML CLI Thread: error parsing telegram: %s", line)
-                    continue
-            else:  # else sleep a bit and then continue reading
-                #                time.sleep(0.5)
                 _lastping = _lastping + _recvtimeout
                 # Ping the gateway to test the connection every 10 minutes
                 if _lastping >= 600:
@@ -301,6 +624,95 @@ class MasterLinkGateway:
                     self._writer.write("\0")
                     _lastping = 0
                 continue
+            except EOFError:
+                _LOGGER.error("ML CLI Thread: EOF Error")
+                self.ml_close()
+                raise
+
+            received = self._hass.loop.time()
+            journal = self.journal
+            for line in linebuffer.lines():
+                if journal is not None:
+                    journal.record(LINK_ML, line, received)
+                self._ml_process_line(line, received)
+
+    def _ml_process_line(self, line, received=None):
+        """Decode a line of the ML CLI log, and act on the telegram in it.
+
+        received: loop time when the line was read, to measure the time to fire the event.
+        """
+        start = time.perf_counter()
+        if received is None:
+            received = self._hass.loop.time()
+        try:
+            timestamp, telegram = parse_ml_line(line)
+            encoded_telegram = decode_ml_to_dict(telegram)
+        except (MLTelegramError, IndexError):
+            self.stats.malformed[LINK_ML] += 1
+            _LOGGER.error("ML CLI Thread: error parsing telegram: %s", line)
+            return
+        except ValueError:  # not a telegram (e.g. the prompt)
+            return
+        encoded_telegram["timestamp"] = timestamp
+        encoded_telegram["bytes"] = telegram.hex()
+
+        # try to find the mln of the from_device and to_device
+        from_x = self._devices_by_ml.get(encoded_telegram["from_device"])
+        if from_x is not None:
+            encoded_telegram["from_mln"] = from_x._mln
+            encoded_telegram["from_name"] = from_x.name
+            encoded_telegram["from_entity_id"] = from_x.entity_id
+        to_x = self._devices_by_ml.get(encoded_telegram["to_device"])
+        if to_x is not None:
+            encoded_telegram["to_mln"] = to_x._mln
+            encoded_telegram["to_name"] = to_x.name
+            encoded_telegram["to_entity_id"] = to_x.entity_id
+        # if a GOTO Source telegram is received, set the beolink source to it
+        # this only tracks the primary beolink source, doesn't track local sources
+        if encoded_telegram["payload_type"] == "GOTO_SOURCE":
+            self._beolink_source = encoded_telegram["payload"]["source"]
+
+        _LOGGER.debug("ML: %s", encoded_telegram)
+
+        self._route_ml_telegram(encoded_telegram, from_x, to_x)
+        for listener in self._ml_telegram_listeners:
+            self._run_callback(listener, encoded_telegram)
+        if self._ml_event_filter(encoded_telegram):
+            self._notify_incoming_ML_telegram(encoded_telegram)
+            self.stats.event_latency[LINK_ML].record(self._hass.loop.time() - received)
+        self.stats.received(
+            LINK_ML, encoded_telegram["payload_type"], time.perf_counter() - start
+        )
+
+    def _route_ml_telegram(self, telegram, from_x, to_x):
+        """Deliver a decoded ML telegram to the devices it concerns.
+
+        from_x, to_x: the devices that sent and receive the telegram, if known.
+        Information to and from the audio master is delivered to every device with a known ML address.
+        """
+        payload_type = telegram["payload_type"]
+        if (
+            telegram["from_device"] == "AUDIO_MASTER"
+            and payload_type in _ML_AUDIO_MASTER_BROADCASTS
+        ) or (telegram["to_device"] == "AUDIO_MASTER" and payload_type == "BEO4_KEY"):
+            for x in self._devices_by_ml.values():
+                self._run_callback(x.handle_ml_broadcast, telegram)
+        if from_x is not None:
+            self._run_callback(from_x.handle_ml_telegram, telegram)
+        if to_x is not None and to_x is not from_x:
+            self._run_callback(to_x.handle_ml_telegram, telegram)
+
+    @staticmethod
+    def _run_callback(func, *args):
+        """Call a device or listener with a telegram.
+
+        Its errors are logged, they must not end the listener of the connection (or make
+        a good telegram look malformed).
+        """
+        try:
+            func(*args)
+        except Exception:  # noqa: BLE001
+            _LOGGER.exception("Error handling a telegram in %s", func)
 
     @callback
     def _notify_incoming_ML_telegram(self, telegram):  # pylint: disable=invalid-name
@@ -311,32 +723,33 @@ class MasterLinkGateway:
     def _notify_incoming_MLGW_telegram(self, telegram):  # pylint: disable=invalid-name
         """Notify hass when an incoming ML message is received."""
         self._hass.bus.async_fire(MLGW_EVENT_MLGW_TELEGRAM, telegram)
+        self.stats.event_latency[LINK_MLGW].record(
+            self._hass.loop.time() - self._mlgw_last_received
+        )
 
     async def async_mlgw_connect(self):
-        """Async version of the mlgw connect function."""
-        loop = asyncio.get_event_loop()
-        # start mlgw_connect(self) in a separate thread, suspend
-        # the current coroutine, and resume when it's done
-        await loop.run_in_executor(None, self.mlgw_connect, self)
-
-    def mlgw_connect(self):
         """Open tcp connection to the mlgw API."""
         _LOGGER.debug("Trying to connect to MLGW API")
-        self._connectedMLGW = False
+        self.mlgw_close()
 
-        # open socket to masterlink gateway
+        # open the connection to masterlink gateway on the event loop
         try:
-            self._socket: socket.socket = socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM
+            (
+                self._transport,
+                self._protocol,
+            ) = await self._hass.loop.create_connection(
+                lambda: MLGWProtocol(self), self._host, self._port
             )
-            self.brokensocket.clear()
-            self._socket.connect((self._host, self._port))
         except OSError as ex:
-            self._socket = None
+            self._transport = None
+            self._protocol = None
             _LOGGER.error("Error connecting to MLGW API %s: %s", self._host, ex)
             raise
 
-        self._connectedMLGW = True
+        _enable_tcp_keepalive(self._transport.get_extra_info("socket"))
+        self._mlgw_last_received = self._hass.loop.time()
+        self._mlgw_login_requested = False
+        self.mlgw_connected.set()
         _LOGGER.debug(
             "MLGW API connection successful to %s port: %s",
             self._host,
@@ -345,65 +758,156 @@ class MasterLinkGateway:
 
     def mlgw_close(self):
         """Close connection to mlgw."""
-        if self._connectedMLGW:
-            self._connectedMLGW = False
-            if self._socket is not None:
-                try:
-                    self._socket.shutdown(socket.SHUT_RDWR)
-                    self._socket.close()
-                    self._socket = None
-                except OSError:
-                    _LOGGER.error("Error closing connection to MLGW API")
-                    return
+        self.mlgw_logged_in.clear()
+        if self.mlgw_connected.is_set():
+            self.mlgw_connected.clear()
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
                 _LOGGER.debug("Closed connection to MLGW API")
 
     def mlgw_login(self):
         """Login to the gateway using username and password."""
         _LOGGER.debug("MLGW: Trying to login")
-        if self._connectedMLGW:
-            wrkstr = self._user + chr(0x00) + self._password
-            payload = bytearray()
-            for c in wrkstr:
-                payload.append(ord(c))
-            self.mlgw_send(0x30, payload)  # login Request
+        wrkstr = self._user + chr(0x00) + self._password
+        payload = bytearray()
+        for c in wrkstr:
+            payload.append(ord(c))
+        self._mlgw_write(_mlgw_telegram(0x30, payload))  # login Request
 
     def mlgw_ping(self):
         """Send a ping to the gateway (used for keepalive)."""
-        self.mlgw_send(0x36, "")
+        self._mlgw_write(_mlgw_telegram(0x36, b""))
 
     def mlgw_send(self, msg_type, payload):
-        """Send a message to the gateway."""
-        if self._connectedMLGW:
-            _telegram = bytearray()
-            _telegram.append(0x01)  # byte[0] SOH
-            _telegram.append(msg_type)  # byte[1] msg_type
-            _telegram.append(len(payload))  # byte[2] Length
-            _telegram.append(0x00)  # byte[3] Spare
-            for p in payload:
-                _telegram.append(p)
-            try:
-                self._socket.sendall(_telegram)
-            except (OSError, BrokenPipeError):
-                self.brokensocket.set()
-                _LOGGER.warning("MLGW: socket broken pipe")
-                return
+        """Queue a message to the gateway. Can be called from any thread.
+
+        The message is sent as soon as the MLGW is connected and logged in, in the order it
+        was queued. If the queue is full the message is dropped.
+        """
+        telegram = _mlgw_telegram(msg_type, payload)
+        queued_at = self._hass.loop.time()
+        # entity methods can run in executor threads, the queue is not thread safe
+        if threading.get_ident() == self._hass.loop_thread_id:
+            self._mlgw_enqueue(telegram, queued_at)
+        else:
+            self._hass.loop.call_soon_threadsafe(
+                self._mlgw_enqueue, telegram, queued_at
+            )
+
+    async def async_mlgw_send(self, msg_type, payload):
+        """Queue a message to the gateway and wait until it is sent.
 
+        Waits for room in the queue if it is full. Raises TimeoutError if the message could
+        not be sent within MLGW_SEND_MAX_AGE seconds, CancelledError if the gateway stops.
+        """
+        sent = self._hass.loop.create_future()
+        await self._send_queue.put(
+            (_mlgw_telegram(msg_type, payload), self._hass.loop.time(), sent)
+        )
+        await sent
+
+    def _mlgw_enqueue(self, telegram, queued_at):
+        try:
+            self._send_queue.put_nowait((telegram, queued_at, None))
+        except asyncio.QueueFull:
+            self.stats.commands_dropped += 1
+            _LOGGER.warning("MLGW: too many commands waiting, command not sent")
+
+    def _mlgw_write(self, telegram):
+        """Write a telegram right away, bypassing the queue (login, ping). Event loop only.
+
+        Returns False if the connection is closed and the telegram was not written.
+        """
+        if self._transport is None or self._transport.is_closing():
+            _LOGGER.debug("MLGW: connection closed, telegram not written")
+            return False
+        self._transport.write(telegram)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
             _LOGGER.debug(
                 "MLGW: >send %s: %s",
-                _getpayloadtypestr(msg_type),
-                _getpayloadstr(_telegram),
+                _getpayloadtypestr(telegram[1]),
+                _getpayloadstr(telegram),
             )
+        return True
+
+    async def _mlgw_writer(self):
+        """Send the queued messages one at a time, in order, whenever the MLGW is ready.
+
+        The messages queued while the connection is down are sent after it comes back,
+        unless they have become too old. A message is only reported sent once it has been
+        written to a connection; if the connection goes away first it is held until the
+        next one.
+        """
+        loop = self._hass.loop
+        while True:
+            telegram, queued_at, sent = await self._send_queue.get()
+            while True:
+                if sent is not None and sent.done():  # the caller gave up
+                    break
+                try:
+                    protocol = await self._async_wait_writable()
+                except asyncio.CancelledError:
+                    if sent is not None:
+                        sent.cancel()
+                    raise
+                if loop.time() - queued_at > MLGW_SEND_MAX_AGE:
+                    _LOGGER.warning(
+                        "MLGW: command not sent, waited more than %s seconds",
+                        MLGW_SEND_MAX_AGE,
+                    )
+                    self.stats.commands_dropped += 1
+                    if sent is not None:
+                        sent.set_exception(TimeoutError())
+                    break
+                if self._mlgw_write(telegram):
+                    self.stats.commands_sent += 1
+                    self.stats.send_latency.record(loop.time() - queued_at)
+                    if sent is not None:
+                        sent.set_result(None)
+                    break
+                # the connection is closing (e.g. aborted by the keepalive): wait until it
+                # is gone, then for the next one
+                try:
+                    await asyncio.shield(protocol.disconnected)
+                except asyncio.CancelledError:
+                    if sent is not None:
+                        sent.cancel()
+                    raise
+
+    async def _async_wait_writable(self):
+        """Wait until the MLGW is logged in and can take more data, return its protocol."""
+        while True:
+            await self.mlgw_logged_in.wait()
+            # the connection can change while waiting, always wait on the current one
+            protocol = self._protocol
+            await protocol.can_write.wait()
+            if self.mlgw_logged_in.is_set() and protocol is self._protocol:
+                return protocol
 
     ## Send Beo4 command to mlgw
     def mlgw_send_beo4_cmd(self, mln, dest, cmd, sec_source=0x00, link=0x00):
         """Send BEO4 command."""
-        _payload = bytearray()
-        _payload.append(mln)  # byte[0] MLN
-        _payload.append(dest)  # byte[1] Dest-Sel (0x00, 0x01, 0x05, 0x0f)
-        _payload.append(cmd)  # byte[2] Beo4 Command
-        _payload.append(sec_source)  # byte[3] Sec-Source
-        _payload.append(link)  # byte[4] Link
-        self.mlgw_send(0x01, _payload)
+        self.mlgw_send(0x01, _beo4_payload(mln, dest, cmd, sec_source, link))
+
+    async def async_send_sequence(
+        self, mln, dest, sequence, sec_source=0x00, link=0x00
+    ):
+        """Send a sequence of Beo4 commands, like the selectSEQ of a favourite channel.
+
+        sequence: Beo4 commands (the digits 0-9 are the commands 0x00-0x09) and
+        {"delay": milliseconds} pauses, e.g. [1, {"delay": 100}, 0].
+        Each pause is timed from the moment the previous command was actually sent, and
+        sequences sent at the same time don't get mixed up.
+        """
+        async with self._sequence_lock:
+            for step in sequence:
+                if isinstance(step, dict):
+                    await asyncio.sleep(step.get("delay", 0) / 1000)
+                else:
+                    await self.async_mlgw_send(
+                        0x01, _beo4_payload(mln, dest, step, sec_source, link)
+                    )
 
     ## Send BeoRemote One command to mlgw
     def mlgw_send_beoremoteone_cmd(self, mln, cmd, network_bit: bool):
@@ -431,7 +935,7 @@ class MasterLinkGateway:
 
         Should change to use a source ID.
         """
-        self._beolink_source = _dictsanitize(beo4_commanddict, source).upper()
+        self._beolink_source = _ML_BEO4_COMMAND_STR[source].upper()
         self.mlgw_send_beo4_cmd(mln, dest, source, sec_source, link)
 
     def mlgw_send_virtual_btn_press(self, btn, act=0x01):
@@ -442,240 +946,360 @@ class MasterLinkGateway:
         """Send an "All Standby" command (turns off the entire B&O System)."""
         self.mlgw_send_beo4_cmd(1, 0x0F, 0x0C)
 
-    def mlgw_get_serial(self):
-        """Send the get serial command to the mlgw and store it in the self._serial property."""
-        if self._connectedMLGW:
-            # Request serial number
-            self.mlgw_send(MLGW_PL.get("REQUEST SERIAL NUMBER"), "")
-            (_, self._serial) = self.mlgw_receive()
-            _LOGGER.info("MLGW: Serial number is %s", self._serial)  # info
-
-    def mlgw_thread(self):
-        """Manage the connection with the MLGW API."""
-        connect_retries = 0
-        max_connect_retries = 10
-        retry_delay = 60
-        while connect_retries < max_connect_retries and not self.stopped.is_set():
+    async def async_request_ml_address(self, mln, timeout=ML_ID_TIMEOUT):
+        """Find the ML address (e.g. 'AUDIO_MASTER') of the device with the given MLN.
+
+        Sends a harmless Beo4 command (LIGHT TIMEOUT) to the device. The MLGW forwards it
+        on the ML bus to the actual ML address of the device, which the ML CLI reports back.
+        The ML telegram does not carry the MLN, so only one probe is outstanding at a time
+        and the reply is matched to it. After a probe times out the next one waits another
+        timeout, so that a late reply cannot be taken for the answer to the next MLN.
+        A reply is trusted over the address known for another device, which is then stale.
+        Returns None if there is no reply within timeout. Needs the ML CLI connection.
+        """
+        async with self._ml_probe_lock:
+            loop = self._hass.loop
+            delay = self._ml_probe_quiet_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            reply = loop.create_future()
+
+            @callback
+            def _probe_listener(telegram):
+                if (
+                    telegram["from_device"] == "MLGW"
+                    and telegram["payload_type"] == "MLGW_REMOTE_BEO4"
+                    and telegram["payload"]["command"] == "Light Timeout"
+                    and not reply.done()
+                ):
+                    reply.set_result(telegram["to_device"])
+
+            remove_listener = self.add_ml_telegram_listener(_probe_listener)
+            try:
+                self.mlgw_send_beo4_cmd(
+                    mln,
+                    reverse_ml_destselectordict.get("AUDIO SOURCE"),
+                    BEO4_CMDS.get("LIGHT TIMEOUT"),
+                )
+                return await asyncio.wait_for(reply, timeout)
+            except TimeoutError:
+                self._ml_probe_quiet_until = loop.time() + timeout
+                return None
+            finally:
+                remove_listener()
+
+    async def async_mlgw_request(
+        self, msg_type, payload, response_type, timeout=TIMEOUT
+    ) -> bytes:
+        """Send a message to the gateway and wait for the reply.
+
+        response_type: the payload type of the reply (e.g. 0x3A Serial Number for 0x39
+        Request Serial Number, 0x31 Login Status for 0x30 Login, 0x37 Pong for 0x36 Ping).
+        Returns the reply telegram (header and payload). The reply is also handled as
+        usual, so it still fires its event. Raises TimeoutError if there is no reply within
+        timeout seconds, ConnectionError if the connection is lost meanwhile.
+        """
+        reply = self._hass.loop.create_future()
+        self._mlgw_pending.setdefault(response_type, []).append(reply)
+        try:
+            if msg_type in _MLGW_SESSION_TYPES:
+                if not self._mlgw_write(_mlgw_telegram(msg_type, payload)):
+                    raise ConnectionError("MLGW connection closed")
+            else:
+                self.mlgw_send(msg_type, payload)
+            return await asyncio.wait_for(reply, timeout)
+        finally:
+            waiting = self._mlgw_pending.get(response_type)
+            if waiting is not None and reply in waiting:
+                waiting.remove(reply)
+                if not waiting:
+                    del self._mlgw_pending[response_type]
+
+    async def async_mlgw_ping(self, timeout=TIMEOUT) -> float:
+        """Ping the gateway and return the round trip time in seconds."""
+        sent_at = self._hass.loop.time()
+        await self.async_mlgw_request(0x36, b"", 0x37, timeout)
+        self.ping_rtt = self._hass.loop.time() - sent_at
+        _LOGGER.debug("MLGW: ping round trip %.1f ms", self.ping_rtt * 1000)
+        return self.ping_rtt
+
+    async def async_mlgw_get_serial(self, timeout=TIMEOUT) -> str:
+        """Ask the gateway for its serial number and return it."""
+        reply = await self.async_mlgw_request(
+            MLGW_PL.get("REQUEST SERIAL NUMBER"), b"", 0x3A, timeout
+        )
+        return reply[4 : 4 + reply[2]].decode("utf-8")
+
+    def _mlgw_fail_pending(self):
+        """Fail the requests waiting for a reply, the connection is gone."""
+        pending, self._mlgw_pending = self._mlgw_pending, {}
+        for waiting in pending.values():
+            for reply in waiting:
+                if not reply.done():
+                    reply.set_exception(ConnectionError("MLGW connection lost"))
+
+    async def _async_request_serial(self):
+        """Ask for the serial number after logging in, it is stored by the listener."""
+        try:
+            await self.async_mlgw_get_serial()
+        except (TimeoutError, ConnectionError) as ex:
+            _LOGGER.warning("MLGW: no serial number from %s: %r", self._host, ex)
+
+    async def mlgw_thread(self):
+        """Manage the connection with the MLGW API, reconnecting until the gateway stops."""
+        while not self.stopped.is_set():
             try:
                 # if not connected, then connect
-                if not self._connectedMLGW:
-                    self.mlgw_connect()
+                if not self.mlgw_connected.is_set():
+                    await self.async_mlgw_connect()
                 self.mlgw_ping()  # force a ping so that the MLGW will request authentication
             except OSError:
-                # wait for 1 minute, max 10 times
-                time.sleep(retry_delay)
-                connect_retries = connect_retries + 1
-                continue
-            try:
-                connect_retries = 0  # if connect was successful, reset the attempts
-                self._mlgw_listen()
-                self.mlgw_close()
-            except (ConnectionResetError, OSError):
-                self.mlgw_close()
-                # wait for 1 minute, max 10 times
-                time.sleep(retry_delay)
-                connect_retries = connect_retries + 1
+                await self._mlgw_backoff.wait()
                 continue
-            except KeyboardInterrupt:
-                break
-
-        # after 10 attempts, or if HA asked to stop it, stop the thread
+            self._mlgw_backoff.reset()  # if connect was successful, reset the delay
+            # the gateway is reachable again, so don't wait to retry the ML CLI either
+            self._ml_backoff.wake()
+            await self._mlgw_listen()
+            self.mlgw_close()
+            if not self.stopped.is_set():
+                self.stats.reconnects[LINK_MLGW] += 1
+                await self._mlgw_backoff.wait()
+
+        # if HA asked to stop it, stop the task
         self.mlgw_close()
         _LOGGER.warning("Shutting down MLGW API thread")
 
-    def _mlgw_listen(self):
-        """Listen and manage the MLGW connection."""
-        _recvtimeout = 5  # timeout recv every 5 sec
-        _lastping = 0  # how many seconds ago was the last ping.
-        self._socket.settimeout(_recvtimeout)
+    async def _mlgw_listen(self):
+        """Keep the MLGW connection alive until it is lost.
 
-        while not (self.stopped.is_set() or self.brokensocket.is_set()):
-            response = None
-            try:
-                response = self._socket.recv(self.buffersize)
-            except KeyboardInterrupt:
-                _LOGGER.warning("MLGW: keyboard interrupt in listen thread")
-                raise
-            except socket.timeout:
-                _lastping = _lastping + _recvtimeout
-                # Ping the gateway to test the connection every 10 minutes
-                if _lastping >= 600:
-                    self.mlgw_ping()
-                    _lastping = 0
+        Incoming telegrams are processed by MLGWProtocol as they arrive. After ping_interval
+        seconds without receiving anything the gateway is pinged, and if nothing at all comes
+        back within pong_timeout the connection is considered dead and aborted.
+        """
+        loop = self._hass.loop
+        disconnected = self._protocol.disconnected
+        while not disconnected.done():
+            idle = self._mlgw_last_received + self._ping_interval - loop.time()
+            if idle > 0:
+                try:
+                    await asyncio.wait_for(asyncio.shield(disconnected), idle)
+                except TimeoutError:
+                    pass
                 continue
-            except (ConnectionResetError, OSError):
-                _LOGGER.warning("MLGW: socket connection reset")
-                raise
-
-            if response is not None and response != b"":
-                # Decode response. Response[0] is SOH, or 0x01
-                msg_byte = response[1]
-                msg_type = _getpayloadtypestr(msg_byte)
-                msg_payload = _getpayloadstr(response)
-
-                _LOGGER.debug("MLGW: Msg type: %s: %s", msg_type, msg_payload)
-
-                if msg_byte == 0x02:  # Source status
-                    sourceMLN = response[4]
-                    beolink_source = _getselectedsourcestr(response[5]).upper()
-                    sourceMediumPosition = _hexword(response[6], response[7])
-                    sourcePosition = _hexword(response[8], response[9])
-                    sourceActivity = _getdictstr(mlgw_sourceactivitydict, response[10])
-                    pictureFormat = _getdictstr(ml_pictureformatdict, response[11])
-                    decoded = {}
-                    decoded["payload_type"] = "source_status"
-                    decoded["source_mln"] = sourceMLN
-                    decoded["source"] = beolink_source
-                    decoded["source_medium_position"] = sourceMediumPosition
-                    decoded["source_position"] = sourcePosition
-                    decoded["source_activity"] = sourceActivity
-                    decoded["picture_format"] = pictureFormat
-                    self._hass.add_job(self._notify_incoming_MLGW_telegram, decoded)
-                    # remember the new source
-                    if sourceActivity not in ("Standby", "Unknown"):
-                        self._beolink_source = beolink_source
-                    # change the source of the MLN
-                    # reporting the change
-                    # not sure this works in all situations
-                    sourcePositionInt = response[8] * 256 + response[9]
-                    if (
-                        sourceActivity not in ("Standby", "Unknown")
-                        and sourcePositionInt > 0
-                        and self._devices is not None
-                    ):
-                        for x in self._devices:
-                            if x._mln == sourceMLN:
-                                x.set_source(response[5])
-
-                elif msg_byte == 0x03:  # Picture and Sound status
-                    decoded = {}
-                    decoded["payload_type"] = "pict_sound_status"
-                    sourceMLN = response[4]
-                    decoded["source_mln"] = sourceMLN
-                    decoded["sound_status"] = _getdictstr(
-                        mlgw_soundstatusdict, response[5]
-                    )
-                    decoded["speaker_mode"] = _getdictstr(
-                        mlgw_speakermodedict, response[6]
-                    )
-                    decoded["volume"] = int(response[7])
-                    decoded["screen1_mute"] = _getdictstr(
-                        mlgw_screenmutedict, response[8]
-                    )
-                    decoded["screen1_active"] = _getdictstr(
-                        mlgw_screenactivedict, response[9]
-                    )
-                    decoded["screen2_mute"] = _getdictstr(
-                        mlgw_screenmutedict, response[10]
-                    )
-                    decoded["screen2_active"] = _getdictstr(
-                        mlgw_screenactivedict, response[11]
-                    )
-                    decoded["cinema_mode"] = _getdictstr(
-                        mlgw_cinemamodedict, response[12]
-                    )
-                    decoded["stereo_mode"] = _getdictstr(
-                        mlgw_stereoindicatordict, response[13]
-                    )
-                    self._hass.add_job(self._notify_incoming_MLGW_telegram, decoded)
-                    # if the device picture status is on, then turn on the state in the media_player
-                    if self._devices is not None and (
-                        response[9] == 0x01 or response[11] == 0x01
-                    ):
-                        for x in self._devices:
-                            if x._mln == sourceMLN:
-                                x.set_state(STATE_PLAYING)
-
-                elif msg_byte == 0x04:  # Light / Control command
-                    lcroomnumber = response[4]
-                    lcroom = _getroomstr(lcroomnumber)
-                    if self._mlgw_configurationdata:
-                        for zone in self._mlgw_configurationdata["zones"]:
-                            if zone["number"] == lcroomnumber:
-                                if "name" in zone:
-                                    lcroom = zone["name"]
-                                break
-                    lctype = _getdictstr(mlgw_lctypedict, response[5])
-                    lccommand = _getbeo4commandstr(response[6])
-                    decoded = {}
-                    decoded["payload_type"] = "light_control_event"
-                    decoded["room"] = lcroom
-                    decoded["type"] = lctype
-                    decoded["command"] = lccommand
-                    self._hass.add_job(self._notify_incoming_MLGW_telegram, decoded)
-
-                elif msg_byte == 0x05:  # All Standby
-                    if self._devices is not None:
-                        # set all connected devices state to off
-                        for i in self._devices:
-                            i.set_state(STATE_OFF)
-                    decoded = {}
-                    decoded["payload_type"] = "all_standby"
-                    self._hass.add_job(self._notify_incoming_MLGW_telegram, decoded)
-
-                elif msg_byte == 0x20:  # Virtual Button event
-                    virtual_btn = response[4]
-                    if len(response) < 5:
-                        virtual_action = _getvirtualactionstr(0x01)
-                    else:
-                        virtual_action = _getvirtualactionstr(response[5])
-                    _LOGGER.debug(
-                        "MLGW: Virtual button: %s %s", virtual_btn, virtual_action
-                    )
-                    decoded = {}
-                    decoded["payload_type"] = "virtual_button"
-                    decoded["button"] = virtual_btn
-                    decoded["action"] = virtual_action
-                    self._hass.add_job(self._notify_incoming_MLGW_telegram, decoded)
-
-                elif msg_byte == 0x31:  # Login Status
-                    if msg_payload == "FAIL":
-                        _LOGGER.debug(
-                            "MLGW: MLGW protocol Password required to %s", self._host
-                        )
-                        self.mlgw_login()
-                    elif msg_payload == "OK":
-                        _LOGGER.debug(
-                            "MLGW: MLGW protocol Login successful to %s", self._host
-                        )
-                        self.mlgw_get_serial()
-
-                # elif msg_byte == 0x37:  # Pong (Ping response)
-                #     _LOGGER.debug("mlgw: pong")
-
-                elif msg_byte == 0x38:  # Configuration changed notification
-                    _LOGGER.info("MLGW: configuration changed, reloading component")
-                    service_data = {"entry_id": self._config_entry_id}
-                    self._hass.services.call(
-                        "homeassistant", "reload_config_entry", service_data, False
+            sent_at = loop.time()
+            try:
+                await self.async_mlgw_ping(self._pong_timeout)
+            except TimeoutError:
+                if self._mlgw_last_received < sent_at:
+                    _LOGGER.warning(
+                        "MLGW: no answer to ping in %s seconds, reconnecting",
+                        self._pong_timeout,
                     )
-
-    def mlgw_receive(self):
-        """Receive message from MLGW.
-
-        Returns a tuple: (payload type, payload).
+                    if self._transport is not None:
+                        self._transport.abort()
+                    await disconnected
+            except ConnectionError:
+                await disconnected
+        if not self.stopped.is_set():
+            _LOGGER.warning("MLGW: socket connection reset")
+
+    def _mlgw_process(self, response):
+        """Decode and act on a single MLGW telegram.
+
+        response: the complete telegram (header and payload). Response[0] is SOH, or 0x01
         """
-        if self._connectedMLGW:
-            try:
-                _mlgwdata = self._socket.recv(self.buffersize)
-            except socket.timeout:
-                pass
-            except KeyboardInterrupt:
-                _LOGGER.error("MLGW: KeyboardInterrupt, terminating")
-                self.mlgw_close()
-
-            _payloadstr = _getpayloadstr(_mlgwdata)
-            if _mlgwdata[0] != 0x01:
-                _LOGGER.error("MLGW: Received telegram with SOH byte <> 0x01")
-            if _mlgwdata[3] != 0x00:
-                _LOGGER.error("MLGW: Received telegram with spare byte <> 0x00")
+        start = time.perf_counter()
+        if _LOGGER.isEnabledFor(logging.DEBUG):
             _LOGGER.debug(
-                "MLGW: <recv: %s: %s",
-                _getpayloadtypestr(_mlgwdata[1]),
-                str(_payloadstr),
+                "MLGW: Msg type: %s: %s",
+                _getpayloadtypestr(response[1]),
+                _getpayloadstr(response),
             )
-            return (_mlgwdata[1], str(_payloadstr))
-        return None
+
+        handler = self._mlgw_handlers.get(response[1])
+        if handler is not None:
+            try:
+                handler(response)
+            except IndexError:
+                self.stats.malformed[LINK_MLGW] += 1
+                _LOGGER.error("MLGW: telegram too short: %s", bytes(response).hex())
+            except Exception:  # noqa: BLE001
+                # don't let an error tear down the connection, it would only come back
+                _LOGGER.exception(
+                    "MLGW: error handling telegram: %s", bytes(response).hex()
+                )
+
+        waiting = self._mlgw_pending.pop(response[1], None)
+        if waiting:
+            reply = bytes(response)
+            for future in waiting:
+                if not future.done():
+                    future.set_result(reply)
+        self.stats.received(LINK_MLGW, response[1], time.perf_counter() - start)
+
+    def _mlgw_source_status(self, response):
+        """Handle 0x02: Source status."""
+        sourceMLN = response[4]
+        beolink_source = _SELECTED_SOURCE_UPPER_STR[response[5]]
+        sourceActivity = _SOURCE_ACTIVITY_STR[response[10]]
+        decoded = {
+            "payload_type": "source_status",
+            "source_mln": sourceMLN,
+            "source": beolink_source,
+            "source_medium_position": f"0x{response[6]:02x}{response[7]:02x}",
+            "source_position": f"0x{response[8]:02x}{response[9]:02x}",
+            "source_activity": sourceActivity,
+            "picture_format": _PICTURE_FORMAT_STR[response[11]],
+        }
+        self._notify_incoming_MLGW_telegram(decoded)
+        # remember the new source
+        if sourceActivity not in ("Standby", "Unknown"):
+            self._beolink_source = beolink_source
+            # change the source of the MLN
+            # reporting the change
+            # not sure this works in all situations
+            if response[8] or response[9]:
+                x = self._devices_by_mln.get(sourceMLN)
+                if x is not None:
+                    self._run_callback(x.set_source, response[5])
+
+    def _mlgw_pict_sound_status(self, response):
+        """Handle 0x03: Picture and Sound status."""
+        sourceMLN = response[4]
+        decoded = {
+            "payload_type": "pict_sound_status",
+            "source_mln": sourceMLN,
+            "sound_status": _SOUND_STATUS_STR[response[5]],
+            "speaker_mode": _SPEAKER_MODE_STR[response[6]],
+            "volume": response[7],
+            "screen1_mute": _SCREEN_MUTE_STR[response[8]],
+            "screen1_active": _SCREEN_ACTIVE_STR[response[9]],
+            "screen2_mute": _SCREEN_MUTE_STR[response[10]],
+            "screen2_active": _SCREEN_ACTIVE_STR[response[11]],
+            "cinema_mode": _CINEMA_MODE_STR[response[12]],
+            "stereo_mode": _STEREO_INDICATOR_STR[response[13]],
+        }
+        self._notify_incoming_MLGW_telegram(decoded)
+        # if the device picture status is on, then turn on the state in the media_player
+        if response[9] == 0x01 or response[11] == 0x01:
+            x = self._devices_by_mln.get(sourceMLN)
+            if x is not None:
+                self._run_callback(x.set_state, STATE_PLAYING)
+
+    def _mlgw_light_control(self, response):
+        """Handle 0x04: Light / Control command."""
+        lcroomnumber = response[4]
+        lcroom = self._room_names.get(lcroomnumber)
+        if lcroom is None:
+            lcroom = _getroomstr(lcroomnumber)
+        decoded = {
+            "payload_type": "light_control_event",
+            "room": lcroom,
+            "type": _LC_TYPE_STR[response[5]],
+            "command": _BEO4_COMMAND_STR[response[6]],
+        }
+        self._notify_incoming_MLGW_telegram(decoded)
+
+    def _mlgw_all_standby(self, response):
+        """Handle 0x05: All Standby."""
+        if self._devices is not None:
+            # set all connected devices state to off
+            for i in self._devices:
+                self._run_callback(i.set_state, STATE_OFF)
+        self._notify_incoming_MLGW_telegram({"payload_type": "all_standby"})
+
+    def _mlgw_virtual_button(self, response):
+        """Handle 0x20: Virtual Button event."""
+        virtual_btn = response[4]
+        if response[2] < 2:
+            virtual_action = _VIRTUAL_ACTION_STR[0x01]
+        else:
+            virtual_action = _VIRTUAL_ACTION_STR[response[5]]
+        _LOGGER.debug("MLGW: Virtual button: %s %s", virtual_btn, virtual_action)
+        decoded = {
+            "payload_type": "virtual_button",
+            "button": virtual_btn,
+            "action": virtual_action,
+        }
+        self._notify_incoming_MLGW_telegram(decoded)
+
+    def _mlgw_login_status(self, response):
+        """Handle 0x31: Login Status."""
+        if response[4] == 0x01:  # FAIL
+            _LOGGER.debug("MLGW: MLGW protocol Password required to %s", self._host)
+            self._mlgw_login_requested = True
+            self.mlgw_login()
+        elif response[4] == 0x00:  # OK
+            _LOGGER.debug("MLGW: MLGW protocol Login successful to %s", self._host)
+            self.mlgw_logged_in.set()
+            self._hass.async_create_background_task(
+                self._async_request_serial(), "mlgw request serial"
+            )
+
+    def _mlgw_serial_number(self, response):
+        """Handle 0x3A: Serial Number."""
+        self._serial = bytes(response[4 : 4 + response[2]]).decode("utf-8")
+        _LOGGER.info("MLGW: Serial number is %s", self._serial)  # info
+
+    def _mlgw_pong(self, response):
+        """Handle 0x37: Pong, the answer to a ping."""
+        # a gateway without password protection answers the first ping without asking
+        # for a login: commands can be sent
+        if not self._mlgw_login_requested and not self.mlgw_logged_in.is_set():
+            _LOGGER.debug("MLGW: MLGW protocol no login required by %s", self._host)
+            self.mlgw_logged_in.set()
+
+    def _mlgw_configuration_changed(self, response):
+        """Handle 0x38: Configuration changed notification."""
+        _LOGGER.info("MLGW: configuration changed, reloading component")
+        self._hass.async_create_task(self._async_reload_configuration())
+
+    async def _async_reload_configuration(self):
+        """Reload the config entry with the new configuration of the gateway."""
+        # forget the stored configuration, otherwise the entry would be set up again with
+        # it and reloaded a second time when the new one is fetched in the background.
+        entry_data = self._hass.data.get(DOMAIN, {}).get(self._config_entry_id, {})
+        store = entry_data.get(MLGW_STORE)
+        if store is not None:
+            await store.async_clear_configuration()
+        await self._hass.services.async_call(
+            "homeassistant", "reload_config_entry", {"entry_id": self._config_entry_id}
+        )
+
+
+def _beo4_payload(mln, dest, cmd, sec_source, link):
+    """Build the payload of a 0x01 Beo4 command telegram."""
+    _payload = bytearray()
+    _payload.append(mln)  # byte[0] MLN
+    _payload.append(dest)  # byte[1] Dest-Sel (0x00, 0x01, 0x05, 0x0f)
+    _payload.append(cmd)  # byte[2] Beo4 Command
+    _payload.append(sec_source)  # byte[3] Sec-Source
+    _payload.append(link)  # byte[4] Link
+    return _payload
+
+
+def _mlgw_telegram(msg_type, payload):
+    """Build a MLGW telegram: SOH, type, length, spare and the payload bytes."""
+    telegram = bytearray((MLGW_SOH, msg_type, len(payload), 0x00))
+    telegram.extend(payload)
+    return telegram
+
+
+def _enable_tcp_keepalive(sock):
+    """Let the OS probe an idle connection too, so a dead peer is noticed even without pings."""
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Linux / macOS specific tuning: probe after 60 s idle, every 10 s, give up after 3
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    except OSError as ex:
+        _LOGGER.debug("MLGW: cannot enable TCP keepalive: %s", ex)
 
 
 # ########################################################################################
@@ -692,6 +1316,7 @@ async def create_mlgw_gateway(
     config_entry_id=None,
     default_source=None,
     available_sources=None,
+    ml_event_filter=None,
 ):
     """Create the mlgw gateway.
 
@@ -701,6 +1326,7 @@ async def create_mlgw_gateway(
     use_mllog: True: use the undocumented ML functionality
     config_entry_id: the configuration entry ID of this gateway so it can be reloaded if a config change notification is received from the MLGW.
     default_soruce, available_sources: the static list of sources from configuration yaml
+    ml_event_filter: the options that select the ML telegrams fired as events
     """
     gateway = MasterLinkGateway(
         host,
@@ -713,37 +1339,75 @@ async def create_mlgw_gateway(
         available_sources,
         hass,
         config_entry_id,
+        ml_event_filter,
     )
 
-    # Start the threads to connect the two endpoints
-    threading.Thread(target=gateway.mlgw_thread).start()
+    # Start the tasks to connect the two endpoints
+    gateway.async_create_task(gateway.mlgw_thread())
+    gateway.async_create_task(gateway._mlgw_writer())
 
     if use_mllog is True:
-        #        threading.Thread(target=gateway.ml_thread).start()
-        hass.loop.create_task(gateway.ml_thread())
+        gateway.async_create_task(gateway.ml_thread())
 
+    @callback
     def _stop_listener(_event):
-        gateway.stopped.set()
+        hass.async_create_task(gateway.terminate_async())
 
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _stop_listener)
-
-    async def wait_to_connect():
-        # Wait until gateway is connected on both MLGW and ML (if we are using it)
-        while (gateway.connectedMLGW is False) or (
-            gateway.connectedML is False and gateway.use_mllog is True
-        ):
-            await asyncio.sleep(1)
+    remove_stop_listener = hass.bus.async_listen_once(
+        EVENT_HOMEASSISTANT_STOP, _stop_listener
+    )
 
-    # wait to connect at most 20 seconds
+    # Wait at most 20 seconds for the MLGW connection. The ML CLI (if we are using it) keeps
+    # connecting in the background, whoever needs it waits for gateway.ml_connected.
     try:
-        await asyncio.wait_for(wait_to_connect(), timeout=20)
+        await asyncio.wait_for(gateway.mlgw_connected.wait(), timeout=20)
     except TimeoutError:
         _LOGGER.warning("MLGW: timeout connecting with the MLGW!")
+        remove_stop_listener()
+        await gateway.terminate_async()
         return None
 
     return gateway
 
 
+# ########################################################################################
+# ##### ML event filter
+
+
+def compile_ml_event_filter(config):
+    """Compile the ML event filter options into a predicate on decoded ML telegrams.
+
+    config: mapping with the CONF_ML_EVENT_* options. Each include option is a list of
+    accepted values for a telegram field, an empty or missing list accepts any value.
+    Returns a function that is True if the telegram must be fired as an event.
+    """
+    checks = []
+    for option, field in (
+        (CONF_ML_EVENT_PAYLOAD_TYPES, "payload_type"),
+        (CONF_ML_EVENT_TYPES, "type"),
+        (CONF_ML_EVENT_FROM_DEVICES, "from_device"),
+        (CONF_ML_EVENT_TO_DEVICES, "to_device"),
+    ):
+        if config.get(option):
+            checks.append((field, frozenset(config[option]), True))
+    exclude = config.get(
+        CONF_ML_EVENT_EXCLUDE_PAYLOAD_TYPES, DEFAULT_ML_EVENT_EXCLUDE_PAYLOAD_TYPES
+    )
+    if exclude:
+        checks.append(("payload_type", frozenset(exclude), False))
+
+    if not checks:
+        return lambda telegram: True
+
+    def _ml_event_filter(telegram):
+        for field, values, accept in checks:
+            if (telegram[field] in values) is not accept:
+                return False
+        return True
+
+    return _ml_event_filter
+
+
 # ########################################################################################
 # ##### Utility functions
 
@@ -761,11 +1425,42 @@ def _hexword(byte1, byte2):
     return resultstr
 
 
-def _dictsanitize(d, s):
-    result = d.get(s)
-    if result is None:
-        result = "UNKNOWN (type=" + _hexbyte(s) + ")"
-    return str(result)
+def _lookup_table(mydict, default_format="{}"):
+    """Build a 256 entry tuple that maps every byte value to its string.
+
+    Bytes missing from mydict are rendered with default_format applied to their hex value.
+    """
+    return tuple(
+        mydict[i] if i in mydict else default_format.format(_hexbyte(i))
+        for i in range(256)
+    )
+
+
+# Precomputed byte -> string tables for the MLGW payload decoders
+_SELECTED_SOURCE_UPPER_STR = tuple(
+    x.upper() for x in _lookup_table(ml_selectedsourcedict, "Src={}")
+)
+_SOURCE_ACTIVITY_STR = _lookup_table(mlgw_sourceactivitydict)
+_PICTURE_FORMAT_STR = _lookup_table(ml_pictureformatdict)
+_SOUND_STATUS_STR = _lookup_table(mlgw_soundstatusdict)
+_SPEAKER_MODE_STR = _lookup_table(mlgw_speakermodedict)
+_SCREEN_MUTE_STR = _lookup_table(mlgw_screenmutedict)
+_SCREEN_ACTIVE_STR = _lookup_table(mlgw_screenactivedict)
+_CINEMA_MODE_STR = _lookup_table(mlgw_cinemamodedict)
+_STEREO_INDICATOR_STR = _lookup_table(mlgw_stereoindicatordict)
+_LC_TYPE_STR = _lookup_table(mlgw_lctypedict)
+_BEO4_COMMAND_STR = _lookup_table(beo4_commanddict, "Cmd={}")
+_VIRTUAL_ACTION_STR = _lookup_table(mlgw_virtualactiondict, "Action={}")
+
+# Precomputed byte -> string tables for the ML telegram decoders
+_ML_UNKNOWN = "UNKNOWN (type={})"
+_ML_TELEGRAM_TYPE_STR = _lookup_table(ml_telegram_type_dict, _ML_UNKNOWN)
+_ML_COMMAND_TYPE_STR = _lookup_table(ml_command_type_dict, _ML_UNKNOWN)
+_ML_SOURCE_STR = _lookup_table(ml_selectedsourcedict, _ML_UNKNOWN)
+_ML_STATE_STR = _lookup_table(ml_state_dict, _ML_UNKNOWN)
+_ML_PICTURE_FORMAT_STR = _lookup_table(ml_pictureformatdict, _ML_UNKNOWN)
+_ML_BEO4_COMMAND_STR = _lookup_table(beo4_commanddict, _ML_UNKNOWN)
+_ML_DEST_SELECTOR_STR = _lookup_table(ml_destselectordict, _ML_UNKNOWN)
 
 
 # ########################################################################################
@@ -793,152 +1488,227 @@ def decode_device(d):
         return hex(d)
 
 
+_ML_DEVICE_STR = tuple(decode_device(d) for d in range(256))
+
+
 # ########################################################################################
-# ##### Decode Masterlink Protocol packet to a serializable dict
+# ##### Parse a line of the ML CLI log
+
+
+def _parse_ml_timestamp(stamp: bytes) -> str:
+    """Convert a '20240131-18:05:42:123:' ML CLI timestamp into an ISO format string."""
+    if (
+        len(stamp) < 20
+        or stamp[8] != 0x2D  # "-"
+        or stamp[11] != 0x3A  # ":"
+        or stamp[14] != 0x3A
+        or stamp[17] != 0x3A
+        or stamp[-1] != 0x3A
+    ):
+        raise ValueError(f"Not a ML CLI timestamp: {stamp!r}")
+    s = stamp.decode("ascii")
+    return datetime(
+        int(s[0:4]),
+        int(s[4:6]),
+        int(s[6:8]),
+        int(s[9:11]),
+        int(s[12:14]),
+        int(s[15:17]),
+        int(s[18:-1].ljust(6, "0")),
+    ).isoformat()
+
+
+class MLTelegramError(ValueError):
+    """A line of the ML CLI log has a timestamp, but the telegram after it is invalid."""
+
+
+def parse_ml_line(line: bytes) -> tuple[str, bytes]:
+    """Parse a line of the ML CLI log into (ISO timestamp, telegram bytes).
+
+    The line is a timestamp followed by the telegram bytes, each written as two hex
+    digits and a separator, e.g. '20240131-18:05:42:123: c1. 80. 01. 14.'
+    Raises ValueError if the line is not a telegram (e.g. a prompt), MLTelegramError
+    (a ValueError) if it is a telegram that cannot be parsed.
+    """
+    line = line.strip()
+    sep = line.find(b" ")
+    if sep < 0:
+        raise ValueError(f"Not a ML CLI telegram: {line!r}")
+    timestamp = _parse_ml_timestamp(line[:sep])
+    fields = line[sep + 1 :].lstrip()
+    count = (len(fields) + 1) // 4
+    try:
+        if len(fields) % 4 == 3 and fields[3::4] == b" " * (count - 1):
+            # fixed width fields: pick out the two hex digits of every field at once
+            hexdigits = bytearray(2 * count)
+            hexdigits[0::2] = fields[0::4]
+            hexdigits[1::2] = fields[1::4]
+            telegram = bytes.fromhex(hexdigits.decode("ascii"))
+        else:
+            telegram = bytes(int(x[:-1], base=16) for x in fields.split())
+    except ValueError as ex:  # UnicodeDecodeError is a ValueError too
+        raise MLTelegramError(f"Malformed ML CLI telegram: {line!r}") from ex
+    return timestamp, telegram
 
 
-def decode_ml_to_dict(telegram) -> dict:
-    """Convert a binary ML packet into a dict representation of the message.
+# ########################################################################################
+# ##### Decode Masterlink Protocol packet to a serializable dict
 
-    telegram: the binary package
-    """
-    decoded = {}
-    decoded["from_device"] = decode_device(telegram[1])
-    decoded["to_device"] = decode_device(telegram[0])
-    decoded["type"] = _dictsanitize(ml_telegram_type_dict, telegram[3])
-    decoded["src_dest"] = _dictsanitize(ml_selectedsourcedict, telegram[4])
-    decoded["orig_src"] = _dictsanitize(ml_selectedsourcedict, telegram[5])
-    decoded["payload_type"] = _dictsanitize(ml_command_type_dict, telegram[7])
-    decoded["payload_len"] = telegram[8]
-    decoded["payload"] = {}
 
-    # source status info
-    # TTFF__TYDSOS__PTLLPS SR____LS______SLSHTR__ACSTPI________________________TRTR______
-    if telegram[7] == 0x87:
-        decoded["payload"]["source"] = _dictsanitize(
-            ml_selectedsourcedict, telegram[10]
-        )
-        decoded["payload"]["sourceID"] = telegram[10]
-        decoded["payload"]["local_source"] = telegram[13]
-        decoded["payload"]["source_medium"] = _hexword(telegram[18], telegram[17])
-        decoded["payload"]["channel_track"] = (
-            telegram[19] if telegram[8] < 27 else (telegram[36] * 256 + telegram[37])
-        )
-        decoded["payload"]["activity"] = _dictsanitize(ml_state_dict, telegram[21])
-        decoded["payload"]["source_type"] = telegram[22]
-        decoded["payload"]["picture_identifier"] = _dictsanitize(
-            ml_pictureformatdict, telegram[23]
-        )
+def _ml_sourcestr(telegram, index, payload, prefix=""):
+    """Add the name and ID of the source found at telegram[index] to the payload."""
+    payload[prefix + "source"] = _ML_SOURCE_STR[telegram[index]]
+    payload[prefix + "sourceID"] = telegram[index]
+
 
+def _decode_ml_display_source(telegram, payload):
     # display source information
-    if telegram[7] == 0x06:
-        _s = ""
-        for i in range(0, telegram[8] - 5):
-            _s = _s + chr(telegram[i + 15])
-        decoded["payload"]["display_source"] = _s.rstrip()
+    length = max(telegram[8] - 5, 0)
+    payload["display_source"] = telegram[15 : 15 + length].decode("latin-1").rstrip()
+
+
+def _decode_ml_extended_source_information(telegram, payload):
     # extended source information
-    if telegram[7] == 0x0B:
-        decoded["payload"]["info_type"] = telegram[10]
-        _s = ""
-        for i in range(0, telegram[8] - 14):
-            _s = _s + chr(telegram[i + 24])
-        decoded["payload"]["info_value"] = _s
+    payload["info_type"] = telegram[10]
+    length = max(telegram[8] - 14, 0)
+    payload["info_value"] = telegram[24 : 24 + length].decode("latin-1")
+
+
+def _decode_ml_beo4_key(telegram, payload):
     # beo4 command
-    if telegram[7] == 0x0D:
-        decoded["payload"]["source"] = _dictsanitize(
-            ml_selectedsourcedict, telegram[10]
-        )
-        decoded["payload"]["sourceID"] = telegram[10]
-        decoded["payload"]["command"] = _dictsanitize(beo4_commanddict, telegram[11])
-    # audio track info long
-    if telegram[7] == 0x82:
-        decoded["payload"]["source"] = _dictsanitize(
-            ml_selectedsourcedict, telegram[11]
-        )
-        decoded["payload"]["sourceID"] = telegram[11]
-        decoded["payload"]["channel_track"] = telegram[12]
-        decoded["payload"]["activity"] = _dictsanitize(ml_state_dict, telegram[13])
-    # video track info
-    if telegram[7] == 0x94:
-        decoded["payload"]["source"] = _dictsanitize(
-            ml_selectedsourcedict, telegram[13]
-        )
-        decoded["payload"]["sourceID"] = telegram[13]
-        decoded["payload"]["channel_track"] = telegram[11] * 256 + telegram[12]
-        decoded["payload"]["activity"] = _dictsanitize(ml_state_dict, telegram[14])
+    _ml_sourcestr(telegram, 10, payload)
+    payload["command"] = _ML_BEO4_COMMAND_STR[telegram[11]]
+
+
+def _decode_ml_track_info(telegram, payload):
     # track change info
-    if telegram[7] == 0x44:
-        if telegram[9] == 0x07:
-            decoded["payload"]["subtype"] = "Change Source"
-            decoded["payload"]["prev_source"] = _dictsanitize(
-                ml_selectedsourcedict, telegram[11]
-            )
-            decoded["payload"]["prev_sourceID"] = telegram[11]
-            decoded["payload"]["source"] = _dictsanitize(
-                ml_selectedsourcedict, telegram[22]
-            )
-            decoded["payload"]["sourceID"] = telegram[22]
-        elif telegram[9] == 0x05:
-            decoded["payload"]["subtype"] = "Current Source"
-            decoded["payload"]["source"] = _dictsanitize(
-                ml_selectedsourcedict, telegram[11]
-            )
-            decoded["payload"]["sourceID"] = telegram[11]
-        else:
-            decoded["payload"]["subtype"] = "Undefined"
+    if telegram[9] == 0x07:
+        payload["subtype"] = "Change Source"
+        _ml_sourcestr(telegram, 11, payload, "prev_")
+        _ml_sourcestr(telegram, 22, payload)
+    elif telegram[9] == 0x05:
+        payload["subtype"] = "Current Source"
+        _ml_sourcestr(telegram, 11, payload)
+    else:
+        payload["subtype"] = "Undefined"
+
+
+def _decode_ml_goto_source(telegram, payload):
     # goto source
-    if telegram[7] == 0x45:
-        decoded["payload"]["source"] = _dictsanitize(
-            ml_selectedsourcedict, telegram[11]
-        )
-        decoded["payload"]["sourceID"] = telegram[11]
-        decoded["payload"]["channel_track"] = telegram[12]
+    _ml_sourcestr(telegram, 11, payload)
+    payload["channel_track"] = telegram[12]
+
+
+def _decode_ml_remote_beo4(telegram, payload):
     # remote request
-    if telegram[7] == 0x20:
-        decoded["payload"]["command"] = _dictsanitize(beo4_commanddict, telegram[14])
-        decoded["payload"]["dest_selector"] = _dictsanitize(
-            ml_destselectordict, telegram[11]
-        )
+    payload["command"] = _ML_BEO4_COMMAND_STR[telegram[14]]
+    payload["dest_selector"] = _ML_DEST_SELECTOR_STR[telegram[11]]
+
+
+def _decode_ml_lock_manager(telegram, payload):
     # request_key
-    if telegram[7] == 0x5C:
-        if telegram[9] == 0x01:
-            decoded["payload"]["subtype"] = "Request Key"
-        elif telegram[9] == 0x02:
-            decoded["payload"]["subtype"] = "Transfter Key"
-        elif telegram[9] == 0x04:
-            decoded["payload"]["subtype"] = "Key Received"
-        elif telegram[9] == 0x05:
-            decoded["payload"]["subtype"] = "Timeout"
-        else:
-            decoded["payload"]["subtype"] = "Undefined"
+    payload["subtype"] = _ML_LOCK_MANAGER_SUBTYPES.get(telegram[9], "Undefined")
+
+
+def _decode_ml_request_distributed_source(telegram, payload):
     # request distributed audio source
-    if telegram[7] == 0x08:
-        if telegram[9] == 0x01:
-            decoded["payload"]["subtype"] = "Request Source"
-        elif telegram[9] == 0x04:
-            decoded["payload"]["subtype"] = "No Source"
-        elif telegram[9] == 0x06:
-            decoded["payload"]["subtype"] = "Source Active"
-            decoded["payload"]["source"] = _dictsanitize(
-                ml_selectedsourcedict, telegram[13]
-            )
-            decoded["payload"]["sourceID"] = telegram[13]
-        else:
-            decoded["payload"]["subtype"] = "Undefined"
+    payload["subtype"] = _ML_SOURCE_REQUEST_SUBTYPES_DISTRIBUTED.get(
+        telegram[9], "Undefined"
+    )
+    if telegram[9] == 0x06:
+        _ml_sourcestr(telegram, 13, payload)
+
+
+def _decode_ml_request_local_source(telegram, payload):
     # request local audio source
-    if telegram[7] == 0x30:
-        if telegram[9] == 0x02:
-            decoded["payload"]["subtype"] = "Request Source"
-        elif telegram[9] == 0x04:
-            decoded["payload"]["subtype"] = "No Source"
-        elif telegram[9] == 0x06:
-            decoded["payload"]["subtype"] = "Source Active"
-            decoded["payload"]["source"] = _dictsanitize(
-                ml_selectedsourcedict, telegram[11]
-            )
-            decoded["payload"]["sourceID"] = telegram[11]
-        else:
-            decoded["payload"]["subtype"] = "Undefined"
+    payload["subtype"] = _ML_SOURCE_REQUEST_SUBTYPES_LOCAL.get(
+        telegram[9], "Undefined"
+    )
+    if telegram[9] == 0x06:
+        _ml_sourcestr(telegram, 11, payload)
+
+
+def _decode_ml_track_info_long(telegram, payload):
+    # audio track info long
+    _ml_sourcestr(telegram, 11, payload)
+    payload["channel_track"] = telegram[12]
+    payload["activity"] = _ML_STATE_STR[telegram[13]]
+
+
+def _decode_ml_status_info(telegram, payload):
+    # source status info
+    # TTFF__TYDSOS__PTLLPS SR____LS______SLSHTR__ACSTPI________________________TRTR______
+    _ml_sourcestr(telegram, 10, payload)
+    payload["local_source"] = telegram[13]
+    payload["source_medium"] = f"0x{telegram[18]:02x}{telegram[17]:02x}"
+    payload["channel_track"] = (
+        telegram[19] if telegram[8] < 27 else (telegram[36] * 256 + telegram[37])
+    )
+    payload["activity"] = _ML_STATE_STR[telegram[21]]
+    payload["source_type"] = telegram[22]
+    payload["picture_identifier"] = _ML_PICTURE_FORMAT_STR[telegram[23]]
+
+
+def _decode_ml_video_track_info(telegram, payload):
+    # video track info
+    _ml_sourcestr(telegram, 13, payload)
+    payload["channel_track"] = telegram[11] * 256 + telegram[12]
+    payload["activity"] = _ML_STATE_STR[telegram[14]]
+
+
+# Payload decoders, keyed by the payload type byte (telegram[7])
+_ML_PAYLOAD_DECODERS = {
+    0x06: _decode_ml_display_source,
+    0x08: _decode_ml_request_distributed_source,
+    0x0B: _decode_ml_extended_source_information,
+    0x0D: _decode_ml_beo4_key,
+    0x20: _decode_ml_remote_beo4,
+    0x30: _decode_ml_request_local_source,
+    0x44: _decode_ml_track_info,
+    0x45: _decode_ml_goto_source,
+    0x5C: _decode_ml_lock_manager,
+    0x82: _decode_ml_track_info_long,
+    0x87: _decode_ml_status_info,
+    0x94: _decode_ml_video_track_info,
+}
+
+_ML_LOCK_MANAGER_SUBTYPES = {
+    0x01: "Request Key",
+    0x02: "Transfter Key",
+    0x04: "Key Received",
+    0x05: "Timeout",
+}
+_ML_SOURCE_REQUEST_SUBTYPES_DISTRIBUTED = {
+    0x01: "Request Source",
+    0x04: "No Source",
+    0x06: "Source Active",
+}
+_ML_SOURCE_REQUEST_SUBTYPES_LOCAL = {
+    0x02: "Request Source",
+    0x04: "No Source",
+    0x06: "Source Active",
+}
+
+
+def decode_ml_to_dict(telegram) -> dict:
+    """Convert a binary ML packet into a dict representation of the message.
+
+    telegram: the binary package
+    """
+    payload = {}
+    decoded = {
+        "from_device": _ML_DEVICE_STR[telegram[1]],
+        "to_device": _ML_DEVICE_STR[telegram[0]],
+        "type": _ML_TELEGRAM_TYPE_STR[telegram[3]],
+        "src_dest": _ML_SOURCE_STR[telegram[4]],
+        "orig_src": _ML_SOURCE_STR[telegram[5]],
+        "payload_type": _ML_COMMAND_TYPE_STR[telegram[7]],
+        "payload_len": telegram[8],
+        "payload": payload,
+    }
+    decoder = _ML_PAYLOAD_DECODERS.get(telegram[7])
+    if decoder is not None:
+        decoder(telegram, payload)
     return decoded
 
 
@@ -1048,7 +1818,7 @@ def _getpayloadstr(message):
         )
 
     elif message[1] == 0x30:  # Login request
-        wrk = message[4 : 4 + message[2]]
+        wrk = bytearray(message[4 : 4 + message[2]])
         for i in range(0, message[2]):
             if wrk[i] == 0:
                 wrk[i] = 0x7F
@@ -1059,7 +1829,7 @@ def _getpayloadstr(message):
         resultstr = _getdictstr(mlgw_loginstatusdict, message[4])
 
     elif message[1] == 0x3A:  # Serial Number
-        resultstr = message[4 : 4 + message[2]].decode("utf-8")
+        resultstr = bytes(message[4 : 4 + message[2]]).decode("utf-8")
 
     else:  # Display raw payload
         resultstr = ""
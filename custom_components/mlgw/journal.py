@@ -0,0 +1,202 @@
+"""Capture of the gateway traffic into a binary journal, and replay of a journal.
+
+The journal is an append-only file starting with JOURNAL_MAGIC, followed by records: the
+monotonic time of reception (seconds, float64), the link (LINK_MLGW: a port 9000 telegram,
+LINK_ML: a line of the ML CLI log), the length of the data (uint16) and the data as it was
+received. When the file reaches its maximum size it is rotated (mlgw_capture.bin ->
+mlgw_capture.bin.1 ...) and the oldest one is deleted, so the capture never takes more
+than (backup_count + 1) * max_bytes on disk.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    JOURNAL_BACKUP_COUNT,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_MAX_BUFFER,
+    LINK_ML,
+    LINK_MLGW,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+JOURNAL_MAGIC = b"MLGWJRN1"
+_RECORD = struct.Struct("<dBH")  # monotonic time, link, length of the data
+
+
+class MLGWJournal:
+    """Record the telegrams received from the gateway into a rotating journal file.
+
+    record() only appends to a buffer in memory, the file is written in the executor.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        path: str,
+        max_bytes: int,
+        backup_count: int = JOURNAL_BACKUP_COUNT,
+    ) -> None:
+        """Initialize. Nothing is written until the first record."""
+        self._hass = hass
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = bytearray()
+        self._file = None
+        self._flush_task = None
+        self._closing = asyncio.Event()
+        self._closed = False
+        self.records = 0
+        self.dropped = 0
+
+    @callback
+    def record(self, link, data, timestamp):
+        """Add the data received on link at the monotonic timestamp to the journal."""
+        if self._closed:
+            return
+        if len(self._buffer) > JOURNAL_MAX_BUFFER:
+            # the disk does not keep up, don't let the buffer grow without limits
+            self.dropped += 1
+            return
+        self._buffer += _RECORD.pack(timestamp, link, len(data))
+        self._buffer += data
+        self.records += 1
+        if self._flush_task is None:
+            self._flush_task = self._hass.async_create_background_task(
+                self._async_flush(JOURNAL_FLUSH_INTERVAL), "mlgw journal flush"
+            )
+
+    async def _async_flush(self, delay=0):
+        """Write the buffered records to the file after delay seconds (or on close)."""
+        try:
+            if delay:
+                try:
+                    await asyncio.wait_for(self._closing.wait(), delay)
+                except TimeoutError:
+                    pass
+            while self._buffer:
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                await self._hass.async_add_executor_job(self._write, data)
+        except OSError as ex:
+            _LOGGER.error("Error writing the MLGW capture %s: %s", self.path, ex)
+        finally:
+            self._flush_task = None
+
+    async def async_close(self):
+        """Write what is left in the buffer and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._closing.set()
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._async_flush()
+        if self._file is not None:
+            await self._hass.async_add_executor_job(self._file.close)
+            self._file = None
+        _LOGGER.debug(
+            "Closed the MLGW capture %s: %d records, %d dropped",
+            self.path,
+            self.records,
+            self.dropped,
+        )
+
+    def _write(self, data):
+        """Append whole records to the file, rotating it when it reaches max_bytes."""
+        if self._file is None:
+            self._file = open(self.path, "ab")  # noqa: SIM115
+            if self._file.tell() == 0:
+                self._file.write(JOURNAL_MAGIC)
+        offset = 0
+        while offset < len(data):
+            # the records that still fit in the file (at least one in a new file)
+            room = self.max_bytes - self._file.tell()
+            end = offset
+            while end < len(data):
+                size = _RECORD.size + _RECORD.unpack_from(data, end)[2]
+                if end + size - offset > room and (
+                    end > offset or self._file.tell() > len(JOURNAL_MAGIC)
+                ):
+                    break
+                end += size
+            if end == offset:
+                self._rotate()
+                continue
+            self._file.write(data[offset:end])
+            offset = end
+        self._file.flush()
+
+    def _rotate(self):
+        """Shift the backups by one, dropping the oldest, and start a new file."""
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")  # noqa: SIM115
+        self._file.write(JOURNAL_MAGIC)
+
+
+def journal_files(path, backup_count=JOURNAL_BACKUP_COUNT):
+    """The files of a rotated journal that exist, oldest first."""
+    files = [f"{path}.{i}" for i in range(backup_count, 0, -1)] + [path]
+    return [f for f in files if os.path.exists(f)]
+
+
+def read_journal(path, backup_count=JOURNAL_BACKUP_COUNT):
+    """Yield the (timestamp, link, data) records of a journal, oldest first.
+
+    The backups of a rotated journal are read first. A record cut short (e.g. Home
+    Assistant stopped while writing) ends the file it is in.
+    """
+    for name in journal_files(path, backup_count):
+        with open(name, "rb") as f:
+            data = f.read()
+        if not data.startswith(JOURNAL_MAGIC):
+            raise ValueError(f"Not a MLGW capture: {name}")
+        offset = len(JOURNAL_MAGIC)
+        while offset + _RECORD.size <= len(data):
+            timestamp, link, length = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + length > len(data):
+                break
+            yield timestamp, link, data[offset : offset + length]
+            offset += length
+
+
+async def async_replay(gateway, records, speed=1.0):
+    """Feed journal records to the gateway, as if they were received now.
+
+    speed: 1 replays in real time, N N times faster, 0 as fast as possible (still letting
+    the event loop run the state writes every few records).
+    Returns the number of records replayed.
+    """
+    loop = asyncio.get_running_loop()
+    start = None
+    count = 0
+    for timestamp, link, data in records:
+        if speed:
+            if start is None:
+                start = (loop.time(), timestamp)
+            delay = start[0] + (timestamp - start[1]) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 100 == 0:
+            await asyncio.sleep(0)
+        if link == LINK_MLGW:
+            gateway._mlgw_last_received = loop.time()  # noqa: SLF001
+            gateway._mlgw_process(memoryview(data))  # noqa: SLF001
+        elif link == LINK_ML:
+            gateway._ml_process_line(data)  # noqa: SLF001
+        count += 1
+    return count
@@ -3,7 +3,7 @@
 ------------------------------------------------------------
 Where the current sources get modified. There are 3 places:
 
-Media player entity subscribes to
+Media player entity receives from the gateway (ML telegram routing)
 GOTO SOURCE
 TRACK INFO
 Media player entity Select Source
@@ -39,22 +39,26 @@ from homeassistant.components.media_player import (
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import STATE_OFF, STATE_PAUSED, STATE_PLAYING
-from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
 
 from .const import (
     BEO4_CMDS,
+    CHANNEL_DIGIT_DELAY,
+    CHANNEL_SOURCE_DELAY,
     DOMAIN,
-    ML_ID_TIMEOUT,
-    MLGW_EVENT_ML_TELEGRAM,
+    ML_ID_RETRY_DELAY,
+    ML_ID_RETRY_MAX_DELAY,
     MLGW_GATEWAY,
     MLGW_GATEWAY_CONFIGURATION_DATA,
+    MLGW_STORE,
     ml_selectedsource_type_dict,
     ml_selectedsourcedict,
     reverse_ml_destselectordict,
     reverse_ml_selectedsourcedict,
 )
 from .gateway import MasterLinkGateway
+from .store import MLGWStore
 
 SUPPORT_BEO = (
     MediaPlayerEntityFeature.TURN_ON
@@ -64,6 +68,7 @@ SUPPORT_BEO = (
     | MediaPlayerEntityFeature.VOLUME_MUTE
     | MediaPlayerEntityFeature.PREVIOUS_TRACK
     | MediaPlayerEntityFeature.NEXT_TRACK
+    | MediaPlayerEntityFeature.PLAY_MEDIA
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -88,10 +93,11 @@ async def async_setup_entry(
     ]
     gateway: MasterLinkGateway = hass.data[DOMAIN][config_entry.entry_id][MLGW_GATEWAY]
     serial = hass.data[DOMAIN][config_entry.entry_id]["serial"]
+    store: MLGWStore = hass.data[DOMAIN][config_entry.entry_id][MLGW_STORE]
     _LOGGER.debug("Serial (async_setup_entry): %s", serial)
 
     await async_create_devices(
-        mlgw_configurationdata, gateway, async_add_entities, serial
+        mlgw_configurationdata, gateway, async_add_entities, serial, store
     )
 
 
@@ -110,41 +116,53 @@ async def async_setup_platform(hass, config, add_devices, discovery_info=None):
 # #########################################################################################
 #
 async def async_create_devices(
-    mlgw_configurationdata, gateway, async_add_entities, serial=""
+    mlgw_configurationdata, gateway, async_add_entities, serial="", store=None
 ):
-    """Read the configuration data from the gateway, and create the devices."""
-    mp_devices = []
-
-    device_sequence = []
+    """Read the configuration data from the gateway, and create the devices.
 
-    ml_listener_iteration: int = 0
-    ml_devices_scanned: int = 0
-    stop_listening: CALLBACK_TYPE = None
+    store: the MLGWStore of the config entry, where the learned ML addresses are kept.
+    """
+    mp_devices = []
 
-    def _message_listener(_event: Event):
-        nonlocal ml_listener_iteration
-        if (
-            _event.data["from_device"] == "MLGW"
-            and _event.data["payload_type"] == "MLGW_REMOTE_BEO4"
-            and _event.data["payload"]["command"] == "Light Timeout"
-        ):
-            _LOGGER.info(
-                "ML LOG returned ML id %s for MLN %s",
-                _event.data["to_device"],
-                str(gateway.devices[device_sequence[ml_listener_iteration]].mln),
+    # devices that will be asked for their ML address
+    devices_to_probe = []
+
+    async def _async_discover_ml_addresses():
+        # Ask every device for its ML address, which is different from the MLN used by MLGW
+        # Protocol. This allows us to reconnect the ML traffic to a device in Home Assistant.
+        # The devices work without the ML address meanwhile, so this runs in the background
+        # and asks again, less and less often, the devices that did not report back.
+        pending = list(devices_to_probe)
+        retry_delay = ML_ID_RETRY_DELAY
+        while True:
+            # the ML CLI may still be connecting, or reconnecting
+            await gateway.ml_connected.wait()
+            # each probe that times out delays the next one, so ask first the devices
+            # likely to answer: those with no known address yet, or that are on.
+            pending.sort(
+                key=lambda device: device.ml is not None and device.state == STATE_OFF
             )
-            gateway.devices[device_sequence[ml_listener_iteration]].set_ml(
-                _event.data["to_device"]
+            for device in list(pending):
+                ml = await gateway.async_request_ml_address(device.mln)
+                if ml is None:
+                    continue
+                _LOGGER.info("ML LOG returned ML id %s for MLN %s", ml, device.mln)
+                device.set_ml(ml)
+                if store is not None:
+                    store.async_set_ml_address(device.mln, ml)
+                pending.remove(device)
+            if not pending:
+                _LOGGER.info("Got back the ML IDs")
+                return
+            _LOGGER.info(
+                "No ML id for MLN %s, asking again in %d seconds",
+                ", ".join(str(device.mln) for device in pending),
+                retry_delay,
             )
-            ml_listener_iteration = ml_listener_iteration + 1
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, ML_ID_RETRY_MAX_DELAY)
 
     if gateway.connectedMLGW:
-        # listen to ML messages to track down the actual ML id of the device
-        if gateway.use_mllog:
-            stop_listening = gateway._hass.bus.async_listen(
-                MLGW_EVENT_ML_TELEGRAM, _message_listener
-            )
-
         for zone in mlgw_configurationdata["zones"]:
             for product in zone["products"]:
                 device_source_names = [source["name"] for source in product["sources"]]
@@ -158,37 +176,22 @@ async def async_create_devices(
                     product["sources"],
                     serial=serial,
                 )
+                # the address learned last time, until the device reports back again
+                if store is not None and store.ml_address(beospeaker.mln) is not None:
+                    beospeaker.set_ml(store.ml_address(beospeaker.mln))
                 mp_devices.append(beospeaker)
-                # Send a dummy command to the device. If the ML_LOG system is operating, then the MLGW will send a ML telegram
-                # to the actual device, and that will include the ML device address
-                # which is different from the MLN used by MLGW Prototcol. This allows us to reconnect the ML
-                # traffic to a device in Home Assistant. It does not work for NL devices so don't send it if
+                # The ML address discovery does not work for NL devices so skip them if
                 # there is a Serial Number attached to the device.
-                if gateway.connectedML and product.get("sn") is None:
-                    device_sequence.append(len(mp_devices) - 1)  # skip NL devices
-                    gateway.mlgw_send_beo4_cmd(
-                        beospeaker.mln,
-                        reverse_ml_destselectordict.get("AUDIO SOURCE"),
-                        BEO4_CMDS.get("LIGHT TIMEOUT"),
-                    )
-                    ml_devices_scanned = ml_devices_scanned + 1
+                if product.get("sn") is None:
+                    devices_to_probe.append(beospeaker)
 
         async_add_entities(mp_devices)
         gateway.set_devices(
             mp_devices
         )  # tell the gateway the list of devices connected to it.
 
-        # wait for 10 seconds or until all the devices have reported back their ML address
-        if gateway.connectedML:
-            waiting_for = 0.0
-            while (
-                ml_listener_iteration < ml_devices_scanned
-                and waiting_for < ML_ID_TIMEOUT
-            ):
-                await asyncio.sleep(0.1)
-                waiting_for = waiting_for + 0.1
-            stop_listening()  # clean up the listener for the device codes.
-            _LOGGER.info("Got back the ML IDs")
+        if gateway.use_mllog and devices_to_probe:
+            gateway.async_create_task(_async_discover_ml_addresses())
 
     else:
         _LOGGER.error("MLGW Not connected while trying to add media_player devices")
@@ -197,9 +200,28 @@ async def async_create_devices(
 # #########################################################################################
 
 
+_STATUS_ID_TO_SELECT_ID = {
+    statusId: BEO4_CMDS.get(name.upper())
+    for statusId, name in ml_selectedsourcedict.items()
+}
+
+
 def statusID_to_selectID(statusId):
     """Convert statusID into selectID (e.g., Radio 0x6f ==> 0x81)."""
-    return BEO4_CMDS.get(ml_selectedsourcedict.get(statusId).upper())
+    return _STATUS_ID_TO_SELECT_ID.get(statusId)
+
+
+def channels_index(source_info):
+    """Build a {channel number: (name, icon)} index of the favourites of a source."""
+    index = {}
+    for _c in source_info["channels"]:
+        # the channel number is expressed a sequence of digits interspersed by delay commands and ended by a select code.
+        ch = "".join(
+            str(_x) for _x in _c["selectSEQ"] if type(_x) == int and 0 <= _x <= 9
+        )
+        if ch:
+            index.setdefault(int(ch), (_c["name"], _c.get("icon")))
+    return index
 
 
 # #########################################################################################
@@ -217,6 +239,9 @@ def statusID_to_selectID(statusId):
 class BeoSpeaker(MediaPlayerEntity):
     """BeoSpeaker is a Media Player that represents one MasterLink device (e.g., a speaker or a receiver or TV)."""
 
+    # state changes are pushed by the gateway, see schedule_state_write
+    _attr_should_poll = False
+
     def __init__(
         self,
         mln,
@@ -236,178 +261,187 @@ class BeoSpeaker(MediaPlayerEntity):
         self._gateway = gateway
         self._pwon = False
         self._playing = False
-        self._source = self._gateway.default_source
-        self._stop_listening = None
         self._source_names = source_names
         self._sources = sources
+        # lookup tables for the source records, the first record wins on duplicates
+        self._sources_by_name = {}
+        self._sources_by_status_id = {}
+        self._sources_by_select_id = {}
+        for _x in reversed(sources):
+            self._sources_by_name[_x["name"]] = _x
+            if _x.get("statusID") is not None:
+                self._sources_by_status_id[_x["statusID"]] = _x
+            if _x.get("selectID") is not None:
+                self._sources_by_select_id[_x["selectID"]] = _x
+        self._source = self._gateway.default_source
+        self._source_info = self._sources_by_name.get(self._source)
+        # favourite channels of each source, by channel number. The gateway reloads the
+        # config entry on a configuration change notification, which rebuilds them.
+        self._channels_by_source = {
+            name: channels_index(_x)
+            for name, _x in self._sources_by_name.items()
+            if "channels" in _x
+        }
         self._serial = serial
         self._unique_id = f"{self._serial}-media_player-{self._mln}"
 
+        # coalesced state writes
+        self._state_write_pending = False
+        self._written_state = None
+
         # information on the current track
         self.clear_media_info()
 
-        # set up a listener for "RELEASE", "STATUS_INFO" and "GOTO_SOURCE" commands associated with this speaker to
-        # adjust the state. "All Standby" command is managed directly in the MLGW listener in MasterlinkGateway
-
-        def _beospeaker_message_listener(_event: Event):
-            if self._ml is not None:
-                # The message comes from me --------------------------------------------------
-                if _event.data["from_device"] == self._ml:
-                    # I am telling the system I am turning off
-                    if _event.data["payload_type"] == "RELEASE":
-                        _LOGGER.debug("ML: RELEASE id %s", self._ml)
-                        self._pwon = False
-                        self._playing = False
-                        self.clear_media_info()
+    def handle_ml_telegram(self, telegram):
+        """Handle a ML telegram sent by or addressed to this speaker.
 
-                    # I am telling the system I want a source
-                    elif _event.data["payload_type"] == "GOTO_SOURCE":
-                        _LOGGER.debug(
-                            "ML: GOTO_SOURCE %s on device %s",
-                            _event.data["payload"]["source"],
-                            self._ml,
-                        )
-                        # reflect that the device is on and store the requested source
-                        self._pwon = True
-                        self._playing = True
+        Called by the gateway, which routes the telegram using its ML address index.
+        Handles "RELEASE", "STATUS_INFO", "GOTO_SOURCE" and similar commands to adjust
+        the state. "All Standby" command is managed directly in the MLGW listener in
+        MasterlinkGateway.
+        """
+        # The message comes from me --------------------------------------------------
+        if telegram["from_device"] == self._ml:
+            # I am telling the system I am turning off
+            if telegram["payload_type"] == "RELEASE":
+                _LOGGER.debug("ML: RELEASE id %s", self._ml)
+                self._pwon = False
+                self._playing = False
+                self.clear_media_info()
 
-                        self.clear_media_info()
-                        self.set_source(_event.data["payload"]["sourceID"])
+            # I am telling the system I want a source
+            elif telegram["payload_type"] == "GOTO_SOURCE":
+                _LOGGER.debug(
+                    "ML: GOTO_SOURCE %s on device %s",
+                    telegram["payload"]["source"],
+                    self._ml,
+                )
+                # reflect that the device is on and store the requested source
+                self._pwon = True
+                self._playing = True
+
+                self.clear_media_info()
+                self.set_source(telegram["payload"]["sourceID"])
+                self.set_source_info(
+                    telegram["payload"]["sourceID"],
+                    telegram["payload"]["channel_track"],
+                )
+
+            # I am updating the Status of this source
+            elif telegram["payload_type"] == "STATUS_INFO":
+                # special case: I am a Video Device and my source status info changes
+                # the weird logic tries to figure out multiple source devices.
+                if telegram["to_device"] == "MLGW" or (
+                    self._ml == "VIDEO_MASTER"
+                    and telegram["payload"]["channel_track"] > 0x00
+                    and telegram["payload"]["channel_track"] < 0xFFFF
+                    and telegram["payload"]["local_source"] == 0x00
+                ):
+                    self.set_source(telegram["payload"]["sourceID"])
+                    if telegram["payload"]["source"] != "DVD" or (
+                        telegram["payload"]["source"] == "DVD"
+                        and telegram["payload"]["local_source"] != 0x00
+                    ):
                         self.set_source_info(
-                            _event.data["payload"]["sourceID"],
-                            _event.data["payload"]["channel_track"],
+                            telegram["payload"]["sourceID"],
+                            telegram["payload"]["channel_track"],
                         )
+                # If I am an Audio Master
+                if self._ml == "AUDIO_MASTER":
+                    self.set_source(telegram["payload"]["sourceID"])
+                    self.set_source_info(
+                        telegram["payload"]["sourceID"],
+                        telegram["payload"]["channel_track"],
+                    )
 
-                    # I am updating the Status of this source
-                    elif _event.data["payload_type"] == "STATUS_INFO":
-                        # special case: I am a Video Device and my source status info changes
-                        # the weird logic tries to figure out multiple source devices.
-                        if _event.data["to_device"] == "MLGW" or (
-                            self._ml == "VIDEO_MASTER"
-                            and _event.data["payload"]["channel_track"] > 0x00
-                            and _event.data["payload"]["channel_track"] < 0xFFFF
-                            and _event.data["payload"]["local_source"] == 0x00
-                        ):
-                            self.set_source(_event.data["payload"]["sourceID"])
-                            if _event.data["payload"]["source"] != "DVD" or (
-                                _event.data["payload"]["source"] == "DVD"
-                                and _event.data["payload"]["local_source"] != 0x00
-                            ):
-                                self.set_source_info(
-                                    _event.data["payload"]["sourceID"],
-                                    _event.data["payload"]["channel_track"],
-                                )
-                        # If I am an Audio Master
-                        if self._ml == "AUDIO_MASTER":
-                            self.set_source(_event.data["payload"]["sourceID"])
-                            self.set_source_info(
-                                _event.data["payload"]["sourceID"],
-                                _event.data["payload"]["channel_track"],
-                            )
-
-                    elif _event.data["payload_type"] == "VIDEO_TRACK_INFO":
-                        if (
-                            _event.data["payload"]["channel_track"] > 0x00
-                            and _event.data["payload"]["channel_track"] < 0xFF
-                        ):
-                            self.set_source_info(
-                                _event.data["payload"]["sourceID"],
-                                _event.data["payload"]["channel_track"],
-                            )
-
-                # The message is directed to me -------------------------------------------------
-                if _event.data["to_device"] == self._ml:
-                    # I'm being told to change source
+            elif telegram["payload_type"] == "VIDEO_TRACK_INFO":
+                if (
+                    telegram["payload"]["channel_track"] > 0x00
+                    and telegram["payload"]["channel_track"] < 0xFF
+                ):
+                    self.set_source_info(
+                        telegram["payload"]["sourceID"],
+                        telegram["payload"]["channel_track"],
+                    )
+
+        # The message is directed to me -------------------------------------------------
+        if telegram["to_device"] == self._ml:
+            # I'm being told to change source
+            if (
+                telegram["payload_type"] == "TRACK_INFO"
+                and telegram["payload"]["subtype"] == "Change Source"
+            ):
+                self.clear_media_info()
+                self.set_source(telegram["payload"]["sourceID"])
+            # I received a Track Information Long packet - which means I am on
+            elif telegram["payload_type"] == "TRACK_INFO_LONG":
+                if (
+                    telegram["payload"]["channel_track"] > 0
+                    and telegram["payload"]["channel_track"] < 0xFF
+                ) or telegram["payload"]["activity"] == "Playing":
+                    self.set_source_info(
+                        telegram["payload"]["sourceID"],
+                        telegram["payload"]["channel_track"],
+                    )
+
+        self.schedule_state_write()
+
+    def handle_ml_broadcast(self, telegram):
+        """Handle a ML telegram to or from the audio master that concerns every speaker.
+
+        Called by the gateway for DISPLAY_SOURCE and EXTENDED_SOURCE_INFORMATION sent by
+        the AUDIO_MASTER and for BEO4_KEY sent to it.
+        """
+        # handle the extended source information and fill in some info for the UI
+        if telegram["from_device"] == "AUDIO_MASTER":
+            if telegram["payload_type"] == "DISPLAY_SOURCE":
+                if self._source_info is not None:
+                    _statusID = self._source_info["statusID"]
+                    if _statusID in ml_selectedsource_type_dict["AUDIO"]:
+                        self.clear_media_info()
+                        self._media_content_type = MediaType.MUSIC
+            elif telegram["payload_type"] == "EXTENDED_SOURCE_INFORMATION":
+                if self._source_info is not None:
+                    _statusID = self._source_info["statusID"]
                     if (
-                        _event.data["payload_type"] == "TRACK_INFO"
-                        and _event.data["payload"]["subtype"] == "Change Source"
+                        _statusID != 0x97
+                        and _statusID in ml_selectedsource_type_dict["AUDIO"]
                     ):
-                        self.clear_media_info()
-                        self.set_source(_event.data["payload"]["sourceID"])
-                    # I received a Track Information Long packet - which means I am on
-                    elif _event.data["payload_type"] == "TRACK_INFO_LONG":
                         if (
-                            _event.data["payload"]["channel_track"] > 0
-                            and _event.data["payload"]["channel_track"] < 0xFF
-                        ) or _event.data["payload"]["activity"] == "Playing":
-                            self.set_source_info(
-                                _event.data["payload"]["sourceID"],
-                                _event.data["payload"]["channel_track"],
-                            )
-
-                # handle the extended source information and fill in some info for the UI
-                if _event.data["from_device"] == "AUDIO_MASTER":
-                    if _event.data["payload_type"] == "DISPLAY_SOURCE":
-                        if self.source is not None:
-                            _statusID = self._sources[
-                                self._source_names.index(self.source)
-                            ]["statusID"]
-                            if _statusID in ml_selectedsource_type_dict["AUDIO"]:
-                                self.clear_media_info()
-                                self._media_content_type = MediaType.MUSIC
-                    elif _event.data["payload_type"] == "EXTENDED_SOURCE_INFORMATION":
-                        if self.source is not None:
-                            _statusID = self._sources[
-                                self._source_names.index(self.source)
-                            ]["statusID"]
-                            if (
-                                _statusID != 0x97
-                                and _statusID in ml_selectedsource_type_dict["AUDIO"]
-                            ):
-                                if (
-                                    _event.data["orig_src"] == "RADIO"
-                                    or _event.data["orig_src"] == "N.RADIO"
-                                ):
-                                    if _event.data["payload"]["info_type"] == 2:
-                                        self._media_artist = _event.data["payload"][
-                                            "info_value"
-                                        ]
-                                    elif _event.data["payload"]["info_type"] == 3:
-                                        _country = _event.data["payload"]["info_value"]
-                                        self._media_artist += f" / {_country}"
-                                    elif _event.data["payload"]["info_type"] == 4:
-                                        self._media_title = _event.data["payload"][
-                                            "info_value"
-                                        ]
-                                elif (
-                                    _event.data["orig_src"] == "A.MEM"
-                                    or _event.data["orig_src"] == "N.MUSIC"
-                                    or _event.data["orig_src"] == "CD"
-                                ):
-                                    if _event.data["payload"]["info_type"] == 2:
-                                        self._media_album_name = _event.data["payload"][
-                                            "info_value"
-                                        ]
-                                    elif _event.data["payload"]["info_type"] == 3:
-                                        self._media_artist = _event.data["payload"][
-                                            "info_value"
-                                        ]
-                                    elif _event.data["payload"]["info_type"] == 4:
-                                        self._media_title = _event.data["payload"][
-                                            "info_value"
-                                        ]
-
-                # setup STATE ON/OFF through "beo4 key" events on the ML bus
-                if _event.data["to_device"] == "AUDIO_MASTER":
-                    if _event.data["payload_type"] == "BEO4_KEY":
-                        if self.source is not None:
-                            _statusID = self._sources[
-                                self._source_names.index(self.source)
-                            ]["statusID"]
-                            if _statusID == _event.data["payload"]["sourceID"]:
-                                if _event.data["payload"]["command"] == "Go / Play":
-                                    self._playing = True
-                                elif _event.data["payload"]["command"] == "Stop":
-                                    self._playing = False
-
-        if self._gateway._use_mllog:
-            self._stop_listening = gateway._hass.bus.async_listen(
-                MLGW_EVENT_ML_TELEGRAM, _beospeaker_message_listener
-            )
-
-    def __del__(self):
-        if self._gateway._connectedML:
-            self._stop_listening()
+                            telegram["orig_src"] == "RADIO"
+                            or telegram["orig_src"] == "N.RADIO"
+                        ):
+                            if telegram["payload"]["info_type"] == 2:
+                                self._media_artist = telegram["payload"]["info_value"]
+                            elif telegram["payload"]["info_type"] == 3:
+                                _country = telegram["payload"]["info_value"]
+                                self._media_artist += f" / {_country}"
+                            elif telegram["payload"]["info_type"] == 4:
+                                self._media_title = telegram["payload"]["info_value"]
+                        elif (
+                            telegram["orig_src"] == "A.MEM"
+                            or telegram["orig_src"] == "N.MUSIC"
+                            or telegram["orig_src"] == "CD"
+                        ):
+                            if telegram["payload"]["info_type"] == 2:
+                                self._media_album_name = telegram["payload"]["info_value"]
+                            elif telegram["payload"]["info_type"] == 3:
+                                self._media_artist = telegram["payload"]["info_value"]
+                            elif telegram["payload"]["info_type"] == 4:
+                                self._media_title = telegram["payload"]["info_value"]
+
+        # setup STATE ON/OFF through "beo4 key" events on the ML bus
+        if telegram["to_device"] == "AUDIO_MASTER":
+            if telegram["payload_type"] == "BEO4_KEY":
+                if self._source_info is not None:
+                    _statusID = self._source_info["statusID"]
+                    if _statusID == telegram["payload"]["sourceID"]:
+                        if telegram["payload"]["command"] == "Go / Play":
+                            self._playing = True
+                        elif telegram["payload"]["command"] == "Stop":
+                            self._playing = False
+
+        self.schedule_state_write()
 
     def clear_media_info(self):
         """Clear out the information about the current track/channel."""
@@ -422,9 +456,9 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def set_source_info(self, sourceID, channel_track=0):
         """Fill in channel number, name and icon for the UI, if the source ID matches the current source."""
-        if self._source is None:
+        if self._source_info is None:
             return
-        _statusID = self._sources[self._source_names.index(self._source)]["statusID"]
+        _statusID = self._source_info["statusID"]
         if _statusID == sourceID:
             if not self._playing:
                 self._playing = True
@@ -457,30 +491,15 @@ class BeoSpeaker(MediaPlayerEntity):
                 self._media_track = channel_track
                 self._media_title = f"Track {self._media_track}"
 
-            self.schedule_update_ha_state()
+            self.schedule_state_write()
 
     def ch_number_to_name_and_icon(self, source, channel_track):
         """look up the caption corresponding to the command number of the favorites list."""
-        try:
-            source_info = self._sources[self._source_names.index(source)]
-            if "channels" in source_info:  # check if the source has favorites
-                for _c in source_info["channels"]:
-                    # the channel number is expressed a sequence of digits interspersed by delay commands and ended by a select code.
-
-                    ch = ""
-                    for _x in _c["selectSEQ"]:
-                        if type(_x) == int and (int(_x) >= 0 and int(_x) <= 9):
-                            ch += str(_x)  # assembly of the channel number
-                    ch_number = int(ch)
-                    if ch_number == channel_track:
-                        return (_c["name"], _c["icon"])
-
+        channels = self._channels_by_source.get(source)
+        if channels is None:
             _LOGGER.debug("BeoSpeaker: %s does not have Favourites", source)
-
-        except ValueError:
-            _LOGGER.debug("BeoSpeaker: source not known: %s", source)
-
-        return (None, None)
+            return (None, None)
+        return channels.get(channel_track, (None, None))
 
     @property
     def name(self):
@@ -517,8 +536,8 @@ class BeoSpeaker(MediaPlayerEntity):
     def supported_features(self):
         """Flag media player features that are supported."""
         support = SUPPORT_BEO
-        if self.source is not None:
-            _statusID = self._sources[self._source_names.index(self.source)]["statusID"]
+        if self._source_info is not None:
+            _statusID = self._source_info["statusID"]
             if (
                 _statusID in ml_selectedsource_type_dict["AUDIO_PAUSABLE"]
                 or _statusID in ml_selectedsource_type_dict["VIDEO_PAUSABLE"]
@@ -533,6 +552,13 @@ class BeoSpeaker(MediaPlayerEntity):
                 )
         return support
 
+    @property
+    def _destination(self):
+        """Destination (e.g., audio source) of the current source for Beo4 commands."""
+        if self._source_info is None:
+            return reverse_ml_destselectordict.get("AUDIO SOURCE")
+        return self._source_info["destination"]
+
     @property
     def source(self):
         """Name of the current input source."""
@@ -595,7 +621,9 @@ class BeoSpeaker(MediaPlayerEntity):
         return self._media_channel
 
     def set_ml(self, ml: str):
+        old_ml = self._ml
         self._ml = ml
+        self._gateway.device_ml_changed(self, old_ml)
 
     def set_state(self, _state):
         """To be called by the gateway to set the state to off when there is an event on the ml bus that turns off the device."""
@@ -606,17 +634,57 @@ class BeoSpeaker(MediaPlayerEntity):
             self._pwon = False
             self._playing = False
             self.clear_media_info()
+        self.schedule_state_write()
+
+    def schedule_state_write(self):
+        """Write the state to Home Assistant once all the pending changes have been made.
+
+        A burst of telegrams (e.g. GOTO_SOURCE, STATUS_INFO, TRACK_INFO_LONG and the
+        EXTENDED_SOURCE_INFORMATION series) changes the state many times in a row. The
+        write is deferred to the next iteration of the event loop, so the burst results
+        in at most one write, and none if the visible state did not change.
+        Can be called from any thread.
+        """
+        if self.hass is None or self._state_write_pending:
+            return
+        self._state_write_pending = True
+        self.hass.loop.call_soon_threadsafe(self._async_flush_state_write)
+
+    @callback
+    def _async_flush_state_write(self):
+        """Write the state if anything visible changed since the last write."""
+        self._state_write_pending = False
+        if self.entity_id is None:
+            return
+        state = (
+            self.state,
+            self._source,
+            self.supported_features,
+            self._media_content_type,
+            self._media_track,
+            self._media_title,
+            self._media_artist,
+            self._media_album_name,
+            self._media_album_artist,
+            self._media_channel,
+            self._media_image_url,
+        )
+        if state == self._written_state:
+            return
+        self._written_state = state
+        self.async_write_ha_state()
 
     def set_source(self, source):
         """To be called by the gateway to set the source (the source is a statusID e.g., radio=0x6f)."""
         # find the source based on the source ID
-        for _x in self._sources:
-            if _x["statusID"] == source or _x["selectID"] == statusID_to_selectID(
-                source
-            ):
-                self._source = _x["name"]
-                self.schedule_update_ha_state()
-                return
+        _x = self._sources_by_status_id.get(source)
+        if _x is None:
+            _x = self._sources_by_select_id.get(_STATUS_ID_TO_SELECT_ID.get(source))
+        if _x is not None:
+            self._source = _x["name"]
+            self._source_info = _x
+            self.schedule_state_write()
+            return
 
         _LOGGER.debug(
             "BeoSpeaker: set_source %s unknown on device %s", source, self._name
@@ -631,12 +699,12 @@ class BeoSpeaker(MediaPlayerEntity):
         If there is no source in that list, then do nothing
         """
         if self._gateway.beolink_source is not None:
-            for _x in self._sources:
-                if _x["statusID"] == reverse_ml_selectedsourcedict.get(
-                    self._gateway.beolink_source
-                ):
-                    self.select_source(_x["name"])
-                    return
+            _x = self._sources_by_status_id.get(
+                reverse_ml_selectedsourcedict.get(self._gateway.beolink_source)
+            )
+            if _x is not None:
+                self.select_source(_x["name"])
+                return
 
         if self._source is not None:
             self.select_source(self._source)
@@ -658,47 +726,92 @@ class BeoSpeaker(MediaPlayerEntity):
             reverse_ml_destselectordict.get("AUDIO SOURCE"),
             BEO4_CMDS.get("STANDBY"),
         )
+        self.schedule_state_write()
 
     def select_source(self, source):
         """Look up the full information record for the source."""
-        try:
-            _LOGGER.debug("BeoSpeaker: trying to select source: %s", source)
-            source_info = self._sources[self._source_names.index(source)]
+        _LOGGER.debug("BeoSpeaker: trying to select source: %s", source)
+        source_info = self._sources_by_name.get(source)
+        if source_info is None:
+            _LOGGER.debug("BeoSpeaker: source not known: %s", source)
+            return
 
-            self._pwon = True
-            self._playing = True
-            self._source = source
-
-            # traditional sources (Beo4)
-            if source_info["format"] == "F0":
-                dest = source_info["destination"]
-                cmd = source_info["selectCmds"][0]["cmd"]
-                sec = source_info["secondary"]
-                link = source_info["link"]
-                if (
-                    dest is not None
-                    and cmd is not None
-                    and sec is not None
-                    and link is not None
-                ):
-                    self._gateway.mlgw_send_beo4_select_source(
-                        self._mln, dest, cmd, sec, link
-                    )
-            elif source_info["format"] == "F20":  # Network Link / BeoOne sources
-                unit = source_info["selectCmds"][0]["unit"]
-                cmd = source_info["selectCmds"][0]["cmd"]
-                network_bit = source_info["networkBit"]
-                if unit is not None and cmd is not None and network_bit is not None:
-                    self._gateway.mlgw_send_beoremoteone_select_source(
-                        self._mln, cmd, unit, network_bit
-                    )
+        self._pwon = True
+        self._playing = True
+        self._source = source
+        self._source_info = source_info
+        self.schedule_state_write()
+
+        # traditional sources (Beo4)
+        if source_info["format"] == "F0":
+            dest = source_info["destination"]
+            cmd = source_info["selectCmds"][0]["cmd"]
+            sec = source_info["secondary"]
+            link = source_info["link"]
+            if (
+                dest is not None
+                and cmd is not None
+                and sec is not None
+                and link is not None
+            ):
+                self._gateway.mlgw_send_beo4_select_source(
+                    self._mln, dest, cmd, sec, link
+                )
+        elif source_info["format"] == "F20":  # Network Link / BeoOne sources
+            unit = source_info["selectCmds"][0]["unit"]
+            cmd = source_info["selectCmds"][0]["cmd"]
+            network_bit = source_info["networkBit"]
+            if unit is not None and cmd is not None and network_bit is not None:
+                self._gateway.mlgw_send_beoremoteone_select_source(
+                    self._mln, cmd, unit, network_bit
+                )
 
-        except ValueError:
-            _LOGGER.debug("BeoSpeaker: source not known: %s", source)
+    def _channel_sequence(self, media_id: str):
+        """Find the source and the selectSEQ of a favourite channel by name, or dial a number.
+
+        The favourites of the current source are looked up first. A number is dialled as
+        it is on the current source, source is then None, with a delay between the digits
+        as in the favourites. sequence is None if nothing matches.
+        """
+        others = [
+            name
+            for name in self._source_names
+            if name != self._source and name in self._channels_by_source
+        ]
+        for name in [self._source, *others]:
+            source_info = self._sources_by_name.get(name)
+            if source_info is None:
+                continue
+            for channel in source_info.get("channels", []):
+                if channel["name"].casefold() == media_id.casefold():
+                    return name, channel["selectSEQ"]
+        if media_id.isdigit():
+            sequence = []
+            for _d in media_id:
+                if sequence:
+                    sequence.append({"delay": CHANNEL_DIGIT_DELAY})
+                sequence.append(int(_d))
+            return None, sequence
+        return None, None
+
+    async def async_play_media(self, media_type, media_id, **kwargs):
+        """Play a channel: a favourite by name (e.g. KQED) or a channel number (e.g. 12)."""
+        if media_type != MediaType.CHANNEL:
+            _LOGGER.warning("BeoSpeaker: media type %s is not supported", media_type)
+            return
+        source, sequence = self._channel_sequence(str(media_id))
+        if sequence is None:
+            _LOGGER.warning("BeoSpeaker: channel %s not found", media_id)
+            return
+        if source is not None and source != self._source:
+            self.select_source(source)
+            # give the source the time to come on before it gets the digits
+            sequence = [{"delay": CHANNEL_SOURCE_DELAY}, *sequence]
+        await self._gateway.async_send_sequence(self._mln, self._destination, sequence)
 
     def volume_up(self):
         """Crank up the volume."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -707,7 +820,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def volume_down(self):
         """Turn down the volume."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -716,7 +829,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def mute_volume(self, mute):
         """Mute speaker."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -725,7 +838,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def media_play(self):
         """Send play command."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -733,10 +846,11 @@ class BeoSpeaker(MediaPlayerEntity):
         )
         self._pwon = True
         self._playing = True
+        self.schedule_state_write()
 
     def media_stop(self):
         """Send stop command."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -744,10 +858,11 @@ class BeoSpeaker(MediaPlayerEntity):
         )
         self._pwon = True
         self._playing = False
+        self.schedule_state_write()
 
     def media_pause(self):
         """Send stop command."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -755,10 +870,11 @@ class BeoSpeaker(MediaPlayerEntity):
         )
         self._pwon = True
         self._playing = False
+        self.schedule_state_write()
 
     def media_previous_track(self):
         """Send previous track command."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -767,7 +883,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def media_next_track(self):
         """Send next track command."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -776,7 +892,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def set_shuffle(self, shuffle):
         """Enable/disable shuffle mode."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -785,7 +901,7 @@ class BeoSpeaker(MediaPlayerEntity):
 
     def set_repeat(self, repeat):
         """Set repeat mode."""
-        dest = self._sources[self._source_names.index(self._source)]["destination"]
+        dest = self._destination
         self._gateway.mlgw_send_beo4_cmd(
             self._mln,
             dest,
@@ -0,0 +1,183 @@
+"""Profiling of the integration on demand, started by the mlgw.start_profiling service.
+
+For the duration of the profile, the event loop runs under cProfile and the code
+handling the traffic of the gateway (the telegrams dispatched by the listeners, the
+BeoSpeaker handlers, the commands sent) is wrapped with timing spans. At the end two
+files are written in the configuration directory:
+
+- mlgw_profile_<time>.prof: the cProfile statistics, for pstats, snakeviz ...
+- mlgw_profile_<time>.folded: the spans as collapsed stacks with their own time in
+  microseconds, for flamegraph.pl, speedscope ...
+
+The wrappers are set on the instances and removed at the end, so nothing is slowed down
+when not profiling.
+"""
+
+import cProfile
+from datetime import datetime
+import functools
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import PROFILE_FILE
+
+_LOGGER = logging.getLogger(__name__)
+
+# methods wrapped with a span, and the name of the span
+_GATEWAY_SPANS = {
+    "_ml_process_line": "ml_listen",
+    "_mlgw_process": "mlgw_listen",
+    "_notify_incoming_ML_telegram": "fire_ml_event",
+    "_notify_incoming_MLGW_telegram": "fire_mlgw_event",
+    "_mlgw_write": "send",
+}
+_DEVICE_SPANS = {
+    "handle_ml_telegram": "speaker.handle_ml_telegram",
+    "handle_ml_broadcast": "speaker.handle_ml_broadcast",
+    "set_source": "speaker.set_source",
+    "set_state": "speaker.set_state",
+    "schedule_state_write": "speaker.schedule_state_write",
+}
+_SUMMARY_LINES = 15
+
+
+class MLGWProfiler:
+    """Profile the event loop and time the gateway's traffic for a while."""
+
+    def __init__(self, hass: HomeAssistant, gateway) -> None:
+        """Initialize, not profiling."""
+        self._hass = hass
+        self._gateway = gateway
+        self._profile = None
+        self._wrapped = []
+        self._stop_listener = None
+        self._started = None
+        # open spans: their names, and the time spent in their children
+        self._stack = []
+        self._children = []
+        # collapsed stack -> [calls, total time, own time]
+        self._spans = {}
+
+    @property
+    def running(self):
+        """True while profiling."""
+        return self._started is not None
+
+    @callback
+    def start(self, duration):
+        """Start profiling, for duration seconds."""
+        self._started = datetime.now()
+        self._stack.clear()
+        self._children.clear()
+        self._spans = {}
+        for name, span in _GATEWAY_SPANS.items():
+            self._wrap(self._gateway, name, span)
+        for device in self._gateway.devices or ():
+            for name, span in _DEVICE_SPANS.items():
+                self._wrap(device, name, span)
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as ex:
+            # another profiler is running (e.g. the Profiler integration)
+            _LOGGER.warning(
+                "MLGW profiling: cProfile not available (%s), spans only", ex
+            )
+            self._profile = None
+        self._stop_listener = async_call_later(
+            self._hass, duration, self._async_timeout
+        )
+        _LOGGER.info("MLGW profiling started for %s seconds", duration)
+
+    async def _async_timeout(self, _now):
+        self._stop_listener = None
+        await self.async_stop()
+
+    async def async_stop(self):
+        """Stop profiling and write the files.
+
+        Returns the path of the files without their extension, None if not profiling.
+        """
+        if not self.running:
+            return None
+        if self._profile is not None:
+            self._profile.disable()
+        if self._stop_listener is not None:
+            self._stop_listener()
+            self._stop_listener = None
+        for obj, name in self._wrapped:
+            # the wrapper is an instance attribute hiding the method of the class
+            delattr(obj, name)
+        self._wrapped.clear()
+        profile, self._profile = self._profile, None
+        spans, self._spans = self._spans, {}
+        path = self._hass.config.path(
+            PROFILE_FILE.format(self._started.strftime("%Y%m%d-%H%M%S"))
+        )
+        self._started = None
+
+        await self._hass.async_add_executor_job(_write_files, path, profile, spans)
+        _LOGGER.info(
+            "MLGW profiling written to %s.folded%s:\n%s",
+            path,
+            "" if profile is None else f" and {path}.prof",
+            _summary(spans),
+        )
+        return path
+
+    def _wrap(self, obj, name, span):
+        """Time the calls to obj.name as the span, until async_stop."""
+        func = getattr(obj, name)
+        stack = self._stack
+        children = self._children
+        spans = self._spans
+
+        @functools.wraps(func)
+        def _timed(*args, **kwargs):
+            stack.append(span)
+            children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                own = elapsed - children.pop()
+                if children:
+                    children[-1] += elapsed
+                key = ";".join(stack)
+                stack.pop()
+                stats = spans.get(key)
+                if stats is None:
+                    spans[key] = [1, elapsed, own]
+                else:
+                    stats[0] += 1
+                    stats[1] += elapsed
+                    stats[2] += own
+
+        setattr(obj, name, _timed)
+        self._wrapped.append((obj, name))
+
+
+def _write_files(path, profile, spans):
+    """Write the cProfile statistics and the collapsed stacks (in the executor)."""
+    if profile is not None:
+        profile.create_stats()
+        profile.dump_stats(f"{path}.prof")
+    with open(f"{path}.folded", "w", encoding="utf-8") as f:
+        for key, (_, _, own) in spans.items():
+            f.write(f"{key} {round(own * 1_000_000)}\n")
+
+
+def _summary(spans):
+    """The spans that took the most time, one per line."""
+    lines = [
+        f"{key}: {calls} calls, {total * 1000:.1f} ms,"
+        f" {total / calls * 1_000_000:.1f} us/call"
+        for key, (calls, total, _) in sorted(
+            spans.items(), key=lambda item: item[1][1], reverse=True
+        )[:_SUMMARY_LINES]
+    ]
+    return "\n".join(lines) or "no traffic"
@@ -0,0 +1,224 @@
+"""Diagnostic sensors of the traffic with the MasterLink Gateway.
+
+The counters of the gateway (stats.py) are read every STATS_UPDATE_INTERVAL seconds and
+turned into rates and averages over the interval: telegrams per second, time to process a
+telegram, time from receiving it to firing the event, time from a command to sending it.
+"""
+
+from datetime import timedelta
+import logging
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+    DataUpdateCoordinator,
+)
+
+from .const import DOMAIN, LINK_ML, LINK_MLGW, MLGW_GATEWAY, STATS_UPDATE_INTERVAL
+from .gateway import MasterLinkGateway
+from .stats import LINK_NAMES, payload_type_name
+
+_LOGGER = logging.getLogger(__name__)
+
+TELEGRAM_RATE = "telegrams/s"
+
+
+def _rate_description(link, name, enabled=True):
+    return SensorEntityDescription(
+        key=f"{LINK_NAMES[link]}_telegram_rate",
+        name=name,
+        native_unit_of_measurement=TELEGRAM_RATE,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=2,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=enabled,
+    )
+
+
+def _duration_description(key, name, enabled=True):
+    return SensorEntityDescription(
+        key=key,
+        name=name,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=2,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=enabled,
+    )
+
+
+def _counter_description(key, name, enabled=True):
+    return SensorEntityDescription(
+        key=key,
+        name=name,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=enabled,
+    )
+
+
+MLGW_SENSORS = (
+    _rate_description(LINK_MLGW, "MLGW telegrams"),
+    _duration_description("mlgw_process_time", "MLGW processing time", False),
+    _duration_description("mlgw_event_latency", "MLGW event latency"),
+    _duration_description("send_latency", "Command send latency"),
+    _duration_description("ping_rtt", "MLGW ping round trip", False),
+    SensorEntityDescription(
+        key="send_queue_depth",
+        name="Commands waiting",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    _counter_description("commands_dropped", "Commands dropped"),
+    _counter_description("mlgw_malformed", "MLGW malformed telegrams", False),
+    _counter_description("mlgw_reconnects", "MLGW reconnects"),
+)
+
+ML_SENSORS = (
+    _rate_description(LINK_ML, "ML telegrams"),
+    _duration_description("ml_process_time", "ML processing time", False),
+    _duration_description("ml_event_latency", "ML event latency"),
+    _counter_description("ml_malformed", "ML malformed telegrams", False),
+    _counter_description("ml_reconnects", "ML CLI reconnects"),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities,
+):
+    """Add the diagnostic sensors of the gateway through Config Entry."""
+    gateway: MasterLinkGateway = hass.data[DOMAIN][config_entry.entry_id][MLGW_GATEWAY]
+    serial = hass.data[DOMAIN][config_entry.entry_id]["serial"]
+
+    coordinator = MLGWStatsCoordinator(hass, gateway)
+    await coordinator.async_refresh()
+
+    descriptions = MLGW_SENSORS + (ML_SENSORS if gateway.use_mllog else ())
+    async_add_entities(
+        MLGWStatsSensor(coordinator, serial, description)
+        for description in descriptions
+    )
+
+
+class MLGWStatsCoordinator(DataUpdateCoordinator):
+    """Turn the counters of the gateway into rates and averages over the last interval."""
+
+    def __init__(self, hass: HomeAssistant, gateway: MasterLinkGateway) -> None:
+        """Initialize, the first update only takes the starting point of the counters."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name="mlgw statistics",
+            update_interval=timedelta(seconds=STATS_UPDATE_INTERVAL),
+        )
+        self._gateway = gateway
+        self._previous = None
+
+    def _snapshot(self):
+        stats = self._gateway.stats
+        return {
+            "time": self.hass.loop.time(),
+            "telegrams": dict(stats.telegrams),
+            "payload_types": {
+                link: dict(counter) for link, counter in stats.payload_types.items()
+            },
+            "process_time": {
+                link: (h.count, h.total) for link, h in stats.process_time.items()
+            },
+            "event_latency": {
+                link: (h.count, h.total) for link, h in stats.event_latency.items()
+            },
+            "send_latency": (stats.send_latency.count, stats.send_latency.total),
+        }
+
+    async def _async_update_data(self):
+        """Compute the values of the sensors since the previous update."""
+        gateway = self._gateway
+        stats = gateway.stats
+        current = self._snapshot()
+        previous = self._previous or current
+        self._previous = current
+        elapsed = current["time"] - previous["time"]
+
+        data = {
+            "send_latency": _mean_ms(current["send_latency"], previous["send_latency"]),
+            "ping_rtt": None if gateway.ping_rtt is None else gateway.ping_rtt * 1000,
+            "send_queue_depth": gateway.send_queue_depth,
+            "commands_dropped": stats.commands_dropped,
+            "attributes": {
+                "mlgw_malformed": {"discarded_bytes": gateway.discarded_bytes},
+            },
+        }
+        for link, name in LINK_NAMES.items():
+            payload_types = current["payload_types"][link]
+            previous_types = previous["payload_types"][link]
+            if elapsed > 0:
+                data[f"{name}_telegram_rate"] = (
+                    current["telegrams"][link] - previous["telegrams"][link]
+                ) / elapsed
+                data["attributes"][f"{name}_telegram_rate"] = {
+                    payload_type_name(link, payload_type): round(
+                        (n - previous_types.get(payload_type, 0)) / elapsed, 3
+                    )
+                    for payload_type, n in payload_types.items()
+                }
+            else:
+                data[f"{name}_telegram_rate"] = None
+            data[f"{name}_process_time"] = _mean_ms(
+                current["process_time"][link], previous["process_time"][link]
+            )
+            data[f"{name}_event_latency"] = _mean_ms(
+                current["event_latency"][link], previous["event_latency"][link]
+            )
+            data[f"{name}_malformed"] = stats.malformed[link]
+            data[f"{name}_reconnects"] = stats.reconnects[link]
+        return data
+
+
+def _mean_ms(current, previous):
+    """Average in milliseconds of the (count, total) of a histogram between two snapshots."""
+    count = current[0] - previous[0]
+    if count <= 0:
+        return None
+    return (current[1] - previous[1]) / count * 1000
+
+
+class MLGWStatsSensor(CoordinatorEntity, SensorEntity):
+    """A diagnostic sensor of the gateway, updated by MLGWStatsCoordinator."""
+
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        coordinator: MLGWStatsCoordinator,
+        serial,
+        description: SensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor, attached to the gateway's device."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._attr_unique_id = f"{serial}-stats-{description.key}"
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, serial)})
+
+    @property
+    def native_value(self):
+        """The value computed at the last update."""
+        return self.coordinator.data.get(self.entity_description.key)
+
+    @property
+    def extra_state_attributes(self):
+        """Breakdown of the value, e.g. the rate of each payload type."""
+        return self.coordinator.data["attributes"].get(self.entity_description.key)
@@ -0,0 +1,142 @@
+"""Counters and latency histograms of the traffic with the MasterLink Gateway.
+
+Updated by the gateway as telegrams come and go (cheap enough for every telegram), read
+by the diagnostic sensors and the diagnostics download.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+import time
+
+from .const import LINK_ML, LINK_MLGW, mlgw_payloadtypedict
+
+# upper bounds of the histogram buckets, in seconds
+HISTOGRAM_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+LINK_NAMES = {LINK_MLGW: "mlgw", LINK_ML: "ml"}
+
+
+class Histogram:
+    """Distribution of durations, in fixed buckets."""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """Add a duration, in seconds."""
+        self.buckets[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q (0-1) quantile, None if empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(HISTOGRAM_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        """Summary and buckets, in milliseconds."""
+        bounds = [f"<={bound * 1000:g}ms" for bound in HISTOGRAM_BUCKETS]
+        bounds.append(f">{HISTOGRAM_BUCKETS[-1] * 1000:g}ms")
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "max_ms": self.max * 1000,
+            "p50_ms": _ms(self.percentile(0.5)),
+            "p90_ms": _ms(self.percentile(0.9)),
+            "p99_ms": _ms(self.percentile(0.99)),
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class MLGWStats:
+    """Everything that is measured on the two links with the gateway."""
+
+    def __init__(self) -> None:
+        """Start counting from now."""
+        self.started = time.monotonic()
+        # telegrams received, in total and by payload type
+        self.telegrams = dict.fromkeys(LINK_NAMES, 0)
+        self.payload_types = {link: Counter() for link in LINK_NAMES}
+        # time to decode a telegram and act on it: update the devices, fire its event
+        self.process_time = {link: Histogram() for link in LINK_NAMES}
+        # time from receiving the data from the socket to firing the event on the bus
+        self.event_latency = {link: Histogram() for link in LINK_NAMES}
+        # time from a command being requested to written to the socket
+        self.send_latency = Histogram()
+        self.commands_sent = 0
+        # commands not sent: queue full, or waited too long for the connection
+        self.commands_dropped = 0
+        # telegrams too short for their payload type, lines that are not valid telegrams
+        self.malformed = dict.fromkeys(LINK_NAMES, 0)
+        self.reconnects = dict.fromkeys(LINK_NAMES, 0)
+
+    def received(self, link, payload_type, process_time):
+        """Count a telegram received on link, and the time it took to process it."""
+        self.telegrams[link] += 1
+        self.payload_types[link][payload_type] += 1
+        self.process_time[link].record(process_time)
+
+    def as_dict(self):
+        """All the counters and histograms, for the diagnostics."""
+        return {
+            "uptime_s": time.monotonic() - self.started,
+            "links": {
+                name: {
+                    "telegrams": self.telegrams[link],
+                    "payload_types": {
+                        payload_type_name(link, payload_type): n
+                        for payload_type, n in self.payload_types[link].most_common()
+                    },
+                    "process_time": self.process_time[link].as_dict(),
+                    "event_latency": self.event_latency[link].as_dict(),
+                    "malformed": self.malformed[link],
+                    "reconnects": self.reconnects[link],
+                }
+                for link, name in LINK_NAMES.items()
+            },
+            "commands_sent": self.commands_sent,
+            "commands_dropped": self.commands_dropped,
+            "send_latency": self.send_latency.as_dict(),
+        }
+
+
+def payload_type_name(link, payload_type):
+    """MLGW payload types are counted by number, ML ones by name."""
+    if link == LINK_MLGW:
+        return mlgw_payloadtypedict.get(payload_type, f"0x{payload_type:02X}")
+    return payload_type
@@ -0,0 +1,67 @@
+"""Persistent cache of the gateway configuration for the MasterLink Gateway integration.
+
+The last good mlgwpservices.json and the ML addresses learned for each MLN are kept with
+Home Assistant's storage helper, so the devices can be created at startup without waiting
+for the web server of the gateway.
+"""
+
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import STORAGE_KEY, STORAGE_SAVE_DELAY, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MLGWStore:
+    """The stored configuration and ML addresses of one gateway (config entry)."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY.format(entry_id))
+        self.configuration = None
+        self.ml_addresses: dict = {}
+
+    async def async_load(self):
+        """Load the stored data, if any."""
+        data = await self._store.async_load()
+        if data is None:
+            return
+        self.configuration = data.get("configuration")
+        self.ml_addresses = data.get("ml_addresses", {})
+        _LOGGER.debug(
+            "Loaded stored MLGW configuration, timestamp %s",
+            self.configuration.get("timestamp") if self.configuration else None,
+        )
+
+    async def async_save_configuration(self, configuration):
+        """Store a new configuration received from the gateway."""
+        self.configuration = configuration
+        await self._store.async_save(self._data_to_save())
+
+    async def async_clear_configuration(self):
+        """Forget the stored configuration, so the next setup gets it from the gateway."""
+        self.configuration = None
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def async_set_ml_address(self, mln, ml):
+        """Remember the ML address learned for a MLN. Writes are delayed and coalesced."""
+        if self.ml_addresses.get(str(mln)) == ml:
+            return
+        self.ml_addresses[str(mln)] = ml
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def ml_address(self, mln):
+        """Return the ML address stored for a MLN, or None."""
+        return self.ml_addresses.get(str(mln))
+
+    async def async_remove(self):
+        """Remove the stored data, when the config entry is removed."""
+        await self._store.async_remove()
+
+    @callback
+    def _data_to_save(self):
+        return {"configuration": self.configuration, "ml_addresses": self.ml_addresses}
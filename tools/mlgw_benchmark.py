@@ -0,0 +1,474 @@
+"""Benchmarks of the decode and dispatch hot paths of the integration.
+
+Measures, on a corpus of telegrams:
+ - parse_ml_line, MLLineBuffer and decode_ml_to_dict (ML CLI),
+ - the whole ml_listen loop, reading the corpus from a stream,
+ - MLGWFramer, _getpayloadstr and the per-packet _mlgw_process (MLGW protocol),
+ - BeoSpeaker.set_source and ch_number_to_name_and_icon,
+ - the latency from a telegram received to the media player state written, for a MLGW
+   Source Status and for a ML GOTO_SOURCE.
+
+The corpora are captured traffic (--journal: a capture of the integration, --ml-corpus:
+a ML CLI log as text, --mlgw-corpus: the raw port 9000 byte stream) or, by default,
+generated with the telegram builders of mlgw_simulator.py. Results are written as JSON
+(--output) and can be compared with a previous run (--compare): the exit code is 1 if a
+benchmark got slower than --threshold.
+
+Needs Home Assistant installed (e.g. a Home Assistant development environment), run from
+the root of the repository:
+
+    python tools/mlgw_benchmark.py --output bench.json
+    python tools/mlgw_benchmark.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import mlgw_simulator as sim  # noqa: E402
+
+from homeassistant.const import EVENT_STATE_CHANGED  # noqa: E402
+from homeassistant.core import HomeAssistant, callback  # noqa: E402
+
+from custom_components.mlgw import gateway as gw  # noqa: E402
+from custom_components.mlgw.const import LINK_ML, LINK_MLGW  # noqa: E402
+from custom_components.mlgw.journal import read_journal  # noqa: E402
+from custom_components.mlgw.media_player import BeoSpeaker  # noqa: E402
+
+ML_GOTO_SOURCE = 0x45
+SOURCE_RADIO = 0x6F
+SOURCE_CD = 0x8D
+
+
+# ##### Corpora
+
+
+def generate_corpora(simulator, size):
+    """Build a ML CLI log and a port 9000 byte stream with size telegrams each."""
+    ml_lines = []
+    for i in range(size):
+        if i % 4 == 0:
+            telegram = goto_source(i)
+        else:
+            telegram = simulator.ml_storm_telegram()
+        ml_lines.append(sim.ml_line(telegram))
+    mlgw_types = sim.STORM_TYPES + (0x05,)
+    mlgw_stream = b"".join(
+        simulator.storm_telegram(mlgw_types[i % len(mlgw_types)]) for i in range(size)
+    )
+    return b"".join(ml_lines), mlgw_stream
+
+
+def goto_source(i, address=0xC1):
+    """A GOTO_SOURCE from the audio master, alternating between Radio and CD."""
+    source = SOURCE_RADIO if i % 2 else SOURCE_CD
+    payload = bytes((0x01, 0x00, source, 1 + i % 9)) + bytes(6)
+    return sim.ml_telegram(sim.ML_ALL, address, sim.ML_COMMAND, ML_GOTO_SOURCE, payload)
+
+
+def split_ml_corpus(data):
+    """The lines of a ML CLI log that are telegrams, and the telegrams."""
+    lines, telegrams = [], []
+    for line in data.splitlines(keepends=True):
+        try:
+            telegrams.append(gw.parse_ml_line(line)[1])
+        except ValueError:
+            continue
+        lines.append(line)
+    return lines, telegrams
+
+
+def split_mlgw_corpus(data):
+    """The telegrams in a port 9000 byte stream."""
+    framer = gw.MLGWFramer()
+    framer.feed(data)
+    return [bytes(frame) for frame in framer.frames()]
+
+
+def chunks(data, size=1460):
+    """Cut a byte stream into TCP segment sized pieces."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+# ##### Measurements
+
+
+def measure(func, ops, runs, min_time):
+    """Time func (which performs ops operations) and return the seconds per operation.
+
+    func is run a number of times so that each measurement takes at least min_time, after
+    a warmup, runs times.
+    """
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+    values = [elapsed / (loops * ops)]
+    for _ in range(runs - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        values.append((time.perf_counter() - start) / (loops * ops))
+    return values
+
+
+def summarize(kind, values):
+    """Statistics of the measurements, in seconds."""
+    ordered = sorted(values)
+    return {
+        "kind": kind,
+        "unit": "s",
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "median": statistics.median(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": ordered[0],
+        "p90": ordered[int(0.9 * (len(ordered) - 1))],
+        "p99": ordered[int(0.99 * (len(ordered) - 1))],
+        "max": ordered[-1],
+        "values": values,
+    }
+
+
+class Bench:
+    """A gateway with its media players on a Home Assistant instance that is not started."""
+
+    def __init__(self, hass, configuration, ml_addresses=None):
+        """Create the gateway and the devices of the configuration, like the integration.
+
+        ml_addresses: the ML address of each MLN (as a string), by default the ones
+        handed out by the simulator.
+        """
+        self.hass = hass
+        # the media players are not added through an entity platform, on purpose
+        logging.getLogger("homeassistant.helpers.entity").setLevel(logging.ERROR)
+        self.gateway = gw.MasterLinkGateway(
+            "localhost",
+            configuration["port"],
+            "admin",
+            "",
+            configuration,
+            True,
+            None,
+            None,
+            hass,
+        )
+        self.devices = []
+        addresses = iter(sim.ML_ADDRESSES)
+        for zone in configuration["zones"]:
+            for product in zone["products"]:
+                device = BeoSpeaker(
+                    product["MLN"],
+                    product["name"],
+                    zone["number"],
+                    zone["name"],
+                    self.gateway,
+                    [source["name"] for source in product["sources"]],
+                    product["sources"],
+                )
+                device.hass = hass
+                device.entity_id = f"media_player.bench_{product['MLN']}"
+                self.devices.append(device)
+        self.gateway.set_devices(self.devices)
+        for device in self.devices:
+            if ml_addresses is None:
+                device.set_ml(gw.decode_device(next(addresses)))
+            elif str(device.mln) in ml_addresses:
+                device.set_ml(ml_addresses[str(device.mln)])
+
+    def mlgw_process(self, frames):
+        """Process each MLGW telegram, like MLGWProtocol does."""
+        process = self.gateway._mlgw_process  # noqa: SLF001
+        for frame in frames:
+            process(memoryview(frame))
+
+    async def ml_listen(self, data):
+        """Run ml_listen on a stream holding the corpus, until the end of the stream."""
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        self.gateway._reader = reader  # noqa: SLF001
+        try:
+            await self.gateway.ml_listen()
+        except EOFError:
+            pass
+
+    async def latency(self, device, count, send):
+        """Time from send(i) to the state of device being written, count times."""
+        written = None
+
+        @callback
+        def _state_changed(event):
+            if event.data["entity_id"] == device.entity_id and not written.done():
+                written.set_result(time.perf_counter())
+
+        remove = self.hass.bus.async_listen(EVENT_STATE_CHANGED, _state_changed)
+        samples = []
+        try:
+            for i in range(count):
+                written = self.hass.loop.create_future()
+                start = time.perf_counter()
+                send(i)
+                try:
+                    end = await asyncio.wait_for(written, 1)
+                except TimeoutError:
+                    continue  # the telegram did not change the state
+                samples.append(end - start)
+        finally:
+            remove()
+        return samples
+
+
+async def run_benchmarks(args):
+    """Run the benchmarks and return their results, by name."""
+    random.seed(args.seed)
+    simulator = sim.Simulator(sim.parse_args(["--config", args.config]))
+    ml_data, mlgw_data = generate_corpora(simulator, args.size)
+    if args.ml_corpus:
+        with open(args.ml_corpus, "rb") as f:
+            ml_data = f.read()
+    if args.mlgw_corpus:
+        with open(args.mlgw_corpus, "rb") as f:
+            mlgw_data = f.read()
+    if args.journal:
+        records = list(read_journal(args.journal))
+        ml_data = b"".join(data + b"\n" for _, link, data in records if link == LINK_ML)
+        mlgw_data = b"".join(data for _, link, data in records if link == LINK_MLGW)
+    ml_lines, ml_telegrams = split_ml_corpus(ml_data)
+    mlgw_frames = split_mlgw_corpus(mlgw_data)
+    ml_chunks = chunks(b"".join(ml_lines))
+    mlgw_chunks = chunks(mlgw_data)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        bench = Bench(hass, simulator.configuration)
+        device = next(d for d in bench.devices if d.ml == "AUDIO_MASTER")
+        results = {}
+
+        def add(name, kind, values):
+            results[name] = summarize(kind, values)
+            print(
+                f"{name:36} median {results[name]['median'] * 1e6:10.2f} us"
+                f"  p90 {results[name]['p90'] * 1e6:10.2f} us",
+                file=sys.stderr,
+            )
+
+        def run(name, func, ops):
+            if not ops:
+                print(f"{name:36} skipped, empty corpus", file=sys.stderr)
+                return
+            add(name, "throughput", measure(func, ops, args.runs, args.min_time))
+
+        def ml_line_buffer():
+            buffer = gw.MLLineBuffer()
+            for chunk in ml_chunks:
+                buffer.feed(chunk)
+                for _ in buffer.lines():
+                    pass
+
+        def mlgw_framer():
+            framer = gw.MLGWFramer()
+            for chunk in mlgw_chunks:
+                framer.feed(chunk)
+                for _ in framer.frames():
+                    pass
+
+        run(
+            "ml.parse_ml_line",
+            lambda: [gw.parse_ml_line(x) for x in ml_lines],
+            len(ml_lines),
+        )
+        run("ml.line_buffer", ml_line_buffer, len(ml_lines))
+        run(
+            "ml.decode_ml_to_dict",
+            lambda: [gw.decode_ml_to_dict(x) for x in ml_telegrams],
+            len(ml_telegrams),
+        )
+        run("mlgw.framer", mlgw_framer, len(mlgw_frames))
+        run(
+            "mlgw.getpayloadstr",
+            lambda: [gw._getpayloadstr(x) for x in mlgw_frames],  # noqa: SLF001
+            len(mlgw_frames),
+        )
+        run("mlgw.process", lambda: bench.mlgw_process(mlgw_frames), len(mlgw_frames))
+        # let the state writes scheduled meanwhile run
+        await asyncio.sleep(0)
+
+        ml_stream = b"".join(ml_lines)
+        if ml_lines:
+            values = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                await bench.ml_listen(ml_stream)
+                values.append((time.perf_counter() - start) / len(ml_lines))
+            add("ml.listen", "throughput", values)
+
+        sources = [SOURCE_RADIO, SOURCE_CD, 0x00]
+        run(
+            "speaker.set_source",
+            lambda: [device.set_source(s) for s in sources * 100],
+            3 * 100,
+        )
+        await asyncio.sleep(0)
+        names = list(device._source_names)  # noqa: SLF001
+        run(
+            "speaker.ch_number_to_name_and_icon",
+            lambda: [
+                device.ch_number_to_name_and_icon(name, ch)
+                for name in names
+                for ch in range(1, 21)
+            ],
+            len(names) * 20,
+        )
+
+        protocol = gw.MLGWProtocol(bench.gateway)
+        add(
+            "latency.mlgw_source_status",
+            "latency",
+            await bench.latency(
+                device,
+                args.latency_samples,
+                lambda i: protocol.data_received(
+                    simulator.source_status(
+                        device.mln,
+                        SOURCE_RADIO if i % 2 else SOURCE_CD,
+                        sim.ACTIVITY_PLAYING,
+                        1 + i,
+                    )
+                ),
+            ),
+        )
+        reader = asyncio.StreamReader()
+        bench.gateway._reader = reader  # noqa: SLF001
+        listen = hass.loop.create_task(bench.gateway.ml_listen())
+        add(
+            "latency.ml_goto_source",
+            "latency",
+            await bench.latency(
+                device,
+                args.latency_samples,
+                lambda i: reader.feed_data(sim.ml_line(goto_source(i))),
+            ),
+        )
+        reader.feed_eof()
+        try:
+            await listen
+        except EOFError:
+            pass
+
+    return {
+        "metadata": metadata(args, len(ml_lines), len(mlgw_frames)),
+        "benchmarks": results,
+    }
+
+
+def metadata(args, ml_count, mlgw_count):
+    """Describe where and on what the benchmarks ran."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "ml_corpus": args.journal or args.ml_corpus or f"generated, seed {args.seed}",
+        "mlgw_corpus": args.journal
+        or args.mlgw_corpus
+        or f"generated, seed {args.seed}",
+        "ml_telegrams": ml_count,
+        "mlgw_telegrams": mlgw_count,
+        "runs": args.runs,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change of the medians against the baseline; return True if none regressed."""
+    ok = True
+    for name, result in results["benchmarks"].items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if before is None or not before["median"]:
+            continue
+        change = result["median"] / before["median"] - 1
+        regressed = change > threshold
+        ok = ok and not regressed
+        print(
+            f"{name:36} {change:+8.1%}{'  REGRESSION' if regressed else ''}",
+            file=sys.stderr,
+        )
+    return ok
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--config", default=sim.DEFAULT_CONFIG, help="mlgwpservices.json"
+    )
+    parser.add_argument("--ml-corpus", help="ML CLI log (text) to use as ML corpus")
+    parser.add_argument("--mlgw-corpus", help="raw port 9000 stream to use as corpus")
+    parser.add_argument("--journal", help="capture of the integration to use as corpus")
+    parser.add_argument("--size", type=int, default=2000, help="generated telegrams")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per run")
+    parser.add_argument("--latency-samples", type=int, default=500)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown of the median counted as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmarks, write and compare the results."""
+    args = parse_args(argv)
+    # the error and debug logging of the listeners is not part of the measurement
+    logging.basicConfig(level=logging.CRITICAL)
+    results = asyncio.run(run_benchmarks(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        return 0 if compare(results, baseline, args.threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Replay a capture of the gateway traffic into the integration, without the gateway.
+
+The capture is recorded by the integration when "Capture the gateway traffic" is enabled
+in its options (mlgw_capture_<entry id>.bin in the configuration directory, with its
+rotated backups .1, .2 ...). The telegrams are fed to a MasterLinkGateway with the media
+players of the configuration, on a Home Assistant instance that is not started, in real
+time (--speed 1), N times faster (--speed N) or as fast as possible (--speed 0). At the
+end the throughput, the events fired and the state of every media player are printed.
+
+--config is the mlgwpservices.json of the installation, or better its stored copy
+(.storage/mlgw.<entry id>), which also has the ML addresses of the devices.
+
+Needs Home Assistant installed, run from the root of the repository:
+
+    python tools/mlgw_replay.py mlgw_capture_0123.bin --config mlgw.0123 --speed 0
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from mlgw_benchmark import Bench  # noqa: E402
+import mlgw_simulator as sim  # noqa: E402
+
+from homeassistant.core import HomeAssistant, callback  # noqa: E402
+
+from custom_components.mlgw.const import (  # noqa: E402
+    MLGW_EVENT_ML_TELEGRAM,
+    MLGW_EVENT_MLGW_TELEGRAM,
+)
+from custom_components.mlgw.journal import async_replay, read_journal  # noqa: E402
+
+
+def load_configuration(path):
+    """Return the configuration and the stored ML addresses (or None) in path."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "zones" in data:
+        return data, None
+    # the integration's storage file
+    return data["data"]["configuration"], data["data"].get("ml_addresses", {})
+
+
+async def replay(args):
+    """Replay the capture and print what happened."""
+    configuration, ml_addresses = load_configuration(args.config)
+    records = list(read_journal(args.journal))
+    if not records:
+        print("The capture is empty", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        bench = Bench(hass, configuration, ml_addresses)
+        events = {MLGW_EVENT_ML_TELEGRAM: 0, MLGW_EVENT_MLGW_TELEGRAM: 0}
+
+        @callback
+        def _count(event):
+            events[event.event_type] += 1
+            if args.verbose:
+                print(event.event_type, dict(event.data))
+
+        for event_type in events:
+            hass.bus.async_listen(event_type, _count)
+
+        start = time.perf_counter()
+        count = await async_replay(bench.gateway, records, args.speed)
+        # let the last state writes and events run
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{count} records ({records[-1][0] - records[0][0]:.1f} s captured) "
+            f"replayed in {elapsed:.3f} s, {count / elapsed:.0f} records/s"
+        )
+        for event_type, fired in events.items():
+            print(f"{event_type}: {fired} events")
+        for device in bench.devices:
+            state = hass.states.get(device.entity_id)
+            if state is None:
+                print(f"{device.name} (MLN {device.mln}, {device.ml}): no state")
+                continue
+            print(
+                f"{device.name} (MLN {device.mln}, {device.ml}): {state.state}"
+                f" source={state.attributes.get('source')}"
+                f" title={state.attributes.get('media_title')}"
+            )
+    return 0
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("journal", help="the capture (newest file, without .1 .2 ...)")
+    parser.add_argument(
+        "--config",
+        default=sim.DEFAULT_CONFIG,
+        help="mlgwpservices.json or the integration's storage file",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="1: real time, N: N times faster, 0: as fast as possible",
+    )
+    parser.add_argument("--verbose", action="store_true", help="print every event")
+    parser.add_argument("--debug", action="store_true", help="debug log the gateway")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    _args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if _args.debug else logging.WARNING)
+    sys.exit(asyncio.run(replay(_args)))
@@ -0,0 +1,580 @@
+"""Stand-in for a B&O MasterLink Gateway, to exercise the integration without hardware.
+
+Serves on localhost (or any address):
+ - the MLGW protocol (port 9000): login challenge and status, ping / pong, serial number,
+   Beo4 commands answered with Source Status, and the 0x02 / 0x03 / 0x04 / 0x05 / 0x20 /
+   0x38 notifications,
+ - the ML CLI (telnet, port 23): a login prompt, the "MLGW >" prompt and, after
+   "_MLLOG ONLINE", ML telegrams in the CLI log format,
+ - the mlgwpservices.json configuration (HTTP, port 80), optionally behind Basic or
+   Digest authentication, answering 304 to If-Modified-Since.
+
+Telegram storms at a given rate can be generated on both streams to measure throughput
+and latency. Storm telegrams carry a 16 bit sequence number (source position of the
+Source Status, track info or display text of the ML telegram) so the receiver can match
+them up.
+
+The integration connects to the ML CLI on port 23 and to the HTTP server on port 80, so
+either run the simulator with the privileges to bind them, or forward them, e.g.:
+
+    python tools/mlgw_simulator.py --host 127.0.0.2 --password secret --storm-rate 200
+
+Only the Python standard library is needed.
+"""
+
+import argparse
+import asyncio
+import base64
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import time
+
+_LOGGER = logging.getLogger("mlgw_simulator")
+
+DEFAULT_CONFIG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "mlgwpservices.json"
+)
+
+MLGW_SOH = 0x01
+MLGW_HEADER_LEN = 4
+
+# ML addresses handed out to the products, in configuration order
+ML_ADDRESSES = (0xC1, 0xC0, 0xC2) + tuple(range(0x01, 0x80))
+ML_MLGW = 0xF0
+ML_ALL = 0x80
+ML_COMMAND = 0x0A
+ML_RESPONSE = 0x14
+ML_DISPLAY_SOURCE = 0x06
+ML_REMOTE_BEO4 = 0x20
+ML_TRACK_INFO = 0x44
+
+BEO4_STANDBY = 0x0C
+# Beo4 source keys and the source they select
+BEO4_SOURCES = {
+    0x80: 0x0B,  # TV
+    0x81: 0x6F,  # Radio
+    0x82: 0x33,  # V.Aux
+    0x83: 0x97,  # A.Aux
+    0x85: 0x15,  # V.Mem
+    0x86: 0x29,  # DVD
+    0x8A: 0x1F,  # DTV
+    0x8B: 0x47,  # PC
+    0x8D: 0x3E,  # Doorcam
+    0x91: 0x79,  # A.Mem
+    0x92: 0x8D,  # CD
+    0x93: 0xA1,  # N.Radio
+    0x94: 0x7A,  # N.Music
+}
+ACTIVITY_PLAYING = 0x02
+ACTIVITY_STANDBY = 0x06
+
+STORM_TYPES = (0x02, 0x03, 0x04, 0x20)
+
+_IAC = 0xFF
+_SB = 0xFA
+_SE = 0xF0
+
+
+def mlgw_telegram(msg_type, payload=b""):
+    """Build a MLGW telegram: SOH, type, length, spare and the payload bytes."""
+    return bytes((MLGW_SOH, msg_type, len(payload), 0x00)) + bytes(payload)
+
+
+def ml_telegram(
+    to_device, from_device, telegram_type, payload_type, payload, payload_len=None
+):
+    """Build a ML telegram, including the checksum."""
+    telegram = bytearray(
+        (to_device, from_device, 0x01, telegram_type, 0x00, 0x00, 0x00)
+    )
+    if payload_len is None:
+        payload_len = len(payload)
+    telegram += bytes((payload_type, payload_len))
+    telegram += payload
+    telegram.append(sum(telegram) & 0xFF)
+    telegram.append(0x00)
+    return bytes(telegram)
+
+
+def ml_line(telegram):
+    """Format a ML telegram as a line of the ML CLI log."""
+    now = datetime.now()
+    stamp = now.strftime("%Y%m%d-%H:%M:%S:") + f"{now.microsecond // 1000:03d}:"
+    return f"{stamp} {' '.join(f'{b:02x}.' for b in telegram)}\r\n".encode("ascii")
+
+
+def strip_telnet(data):
+    """Remove the telnet option negotiation (IAC sequences) from the received bytes."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] != _IAC:
+            out.append(data[i])
+            i += 1
+        elif i + 1 < len(data) and data[i + 1] == _SB:
+            end = data.find(bytes((_IAC, _SE)), i + 2)
+            i = len(data) if end < 0 else end + 2
+        elif i + 1 < len(data) and 0xFB <= data[i + 1] <= 0xFE:  # WILL WONT DO DONT
+            i += 3
+        else:
+            i += 2
+    return bytes(out)
+
+
+class Simulator:
+    """The shared state of the simulated gateway: products, sessions and counters."""
+
+    def __init__(self, args):
+        """Load the configuration and assign a ML address to every product."""
+        self.args = args
+        with open(args.config, encoding="utf-8") as f:
+            self.configuration = json.load(f)
+        self.configuration["port"] = args.mlgw_port
+        if args.serial:
+            self.configuration["sn"] = args.serial
+        self.serial = str(self.configuration.get("sn", "00000000"))
+        self.products = [
+            product
+            for zone in self.configuration.get("zones", [])
+            for product in zone.get("products", [])
+        ]
+        self.rooms = [zone["number"] for zone in self.configuration.get("zones", [])]
+        self.ml_addresses = {
+            product["MLN"]: address
+            for product, address in zip(self.products, ML_ADDRESSES)
+        }
+        self.sources = {}  # current source by MLN
+        self.mlgw_sessions = set()
+        self.ml_sessions = set()
+        self.sequence = itertools.count()
+        self.counters = dict.fromkeys(("received", "sent", "ml_sent", "dropped"), 0)
+        self.nonce = os.urandom(16).hex()
+
+    # ##### MLGW protocol (port 9000)
+
+    def broadcast(self, telegram):
+        """Send a telegram to all the logged in MLGW clients."""
+        for session in self.mlgw_sessions:
+            session.send(telegram)
+
+    def ml_broadcast(self, telegram):
+        """Send a ML telegram to all the ML CLI clients in log mode."""
+        line = ml_line(telegram)
+        for session in self.ml_sessions:
+            session.send(line)
+
+    def beo4_command(self, mln, dest, cmd):
+        """Act on a Beo4 command: report it on the ML bus and answer with a status."""
+        address = self.ml_addresses.get(mln, ML_ALL)
+        payload = bytes((0x02, 0x00, dest, 0xFF, 0x00, cmd))
+        self.ml_broadcast(
+            ml_telegram(address, ML_MLGW, ML_COMMAND, ML_REMOTE_BEO4, payload)
+        )
+        if cmd == BEO4_STANDBY:
+            self.sources.pop(mln, None)
+            self.broadcast(self.source_status(mln, 0x00, ACTIVITY_STANDBY, 0))
+        elif cmd in BEO4_SOURCES:
+            self.sources[mln] = BEO4_SOURCES[cmd]
+            self.broadcast(
+                self.source_status(mln, BEO4_SOURCES[cmd], ACTIVITY_PLAYING, 1)
+            )
+
+    def source_status(self, mln, source, activity, position):
+        """Build a 0x02 Source Status telegram."""
+        return mlgw_telegram(
+            0x02,
+            (
+                mln,
+                source,
+                0x00,  # medium position
+                0x01,
+                (position >> 8) & 0xFF,  # source position
+                position & 0xFF,
+                activity,
+                0x00,  # picture format
+            ),
+        )
+
+    def storm_telegram(self, msg_type):
+        """Build a notification of the given type, numbered with the next sequence."""
+        seq = next(self.sequence) & 0xFFFF
+        mln = random.choice(self.products)["MLN"] if self.products else 1
+        if msg_type == 0x02:
+            source = self.sources.get(mln, random.choice(tuple(BEO4_SOURCES.values())))
+            return self.source_status(mln, source, ACTIVITY_PLAYING, seq)
+        if msg_type == 0x03:
+            volume = seq % 0x48
+            return mlgw_telegram(0x03, (mln, 0, 0, volume, 0, 1, 0, 0, 0, 0))
+        if msg_type == 0x04:
+            room = random.choice(self.rooms) if self.rooms else 1
+            return mlgw_telegram(0x04, (room, 0x01, 0x01 + seq % 9))
+        if msg_type == 0x05:
+            self.sources.clear()
+            return mlgw_telegram(0x05)
+        if msg_type == 0x20:
+            return mlgw_telegram(0x20, (1 + seq % 10, 0x01))
+        return mlgw_telegram(msg_type)
+
+    def ml_storm_telegram(self):
+        """Build a ML status telegram, numbered with the next sequence."""
+        seq = next(self.sequence) & 0xFFFF
+        address = random.choice(ML_ADDRESSES[:3])
+        source = random.choice(tuple(BEO4_SOURCES.values()))
+        if seq % 2:
+            text = f"TRACK {seq:5d}".encode("latin-1")
+            payload = bytes((0x0B, 0x00, 0x00, 0x00, 0x00, 0x00)) + text
+            # the length of a display source does not count the first payload byte
+            return ml_telegram(
+                ML_ALL, address, ML_RESPONSE, ML_DISPLAY_SOURCE, payload, 5 + len(text)
+            )
+        payload = bytes((0x05, 0x00, source, (seq >> 8) & 0xFF, seq & 0xFF)) + bytes(9)
+        return ml_telegram(ML_ALL, address, ML_RESPONSE, ML_TRACK_INFO, payload)
+
+    async def storm(self, rate, make, send):
+        """Send rate telegrams per second, in bursts every 10 ms."""
+        period = 0.01
+        start = time.monotonic()
+        sent = 0
+        while True:
+            due = int((time.monotonic() - start) * rate)
+            for _ in range(due - sent):
+                send(make())
+            sent = due
+            await asyncio.sleep(period)
+
+    async def report(self):
+        """Log the counters every few seconds."""
+        previous = dict(self.counters)
+        while True:
+            await asyncio.sleep(self.args.report_interval)
+            rates = {
+                key: (value - previous[key]) / self.args.report_interval
+                for key, value in self.counters.items()
+            }
+            previous = dict(self.counters)
+            _LOGGER.info(
+                "clients mlgw=%d ml=%d; per second: %s",
+                len(self.mlgw_sessions),
+                len(self.ml_sessions),
+                ", ".join(f"{key}={rate:.0f}" for key, rate in rates.items()),
+            )
+
+    # ##### HTTP (mlgwpservices.json)
+
+    def authorized(self, headers):
+        """Check the Authorization header against the configured scheme."""
+        scheme = self.args.http_auth
+        if scheme == "none":
+            return True
+        authorization = headers.get("authorization", "")
+        if scheme == "basic":
+            expected = base64.b64encode(
+                f"{self.args.user}:{self.args.password}".encode()
+            ).decode()
+            return authorization == f"Basic {expected}"
+        if not authorization.lower().startswith("digest "):
+            return False
+        params = {}
+        for part in authorization[7:].split(","):
+            key, _, value = part.strip().partition("=")
+            params[key.lower()] = value.strip('"')
+        if params.get("nonce") != self.nonce:
+            return False
+
+        def md5(data):
+            return hashlib.md5(data.encode()).hexdigest()  # noqa: S324
+
+        ha1 = md5(f"{params.get('username')}:mlgw:{self.args.password}")
+        ha2 = md5(f"GET:{params.get('uri')}")
+        if params.get("qop"):
+            expected = md5(
+                f"{ha1}:{self.nonce}:{params.get('nc')}:{params.get('cnonce')}"
+                f":{params.get('qop')}:{ha2}"
+            )
+        else:
+            expected = md5(f"{ha1}:{self.nonce}:{ha2}")
+        return (
+            params.get("username") == self.args.user
+            and params.get("response") == expected
+        )
+
+    def http_response(self, path, headers):
+        """Return status, extra headers and body for a GET request."""
+        if path.split("?")[0] != "/mlgwpservices.json":
+            return 404, {}, b""
+        if not self.authorized(headers):
+            if self.args.http_auth == "digest":
+                challenge = f'Digest realm="mlgw", nonce="{self.nonce}", qop="auth"'
+            else:
+                challenge = 'Basic realm="mlgw"'
+            return 401, {"WWW-Authenticate": challenge}, b""
+        since = headers.get("if-modified-since")
+        if since:
+            try:
+                if self.configuration.get("timestamp", 0) <= (
+                    parsedate_to_datetime(since).timestamp()
+                ):
+                    return 304, {}, b""
+            except (TypeError, ValueError):
+                pass
+        body = json.dumps(self.configuration).encode("utf-8")
+        return 200, {"Content-Type": "application/json"}, body
+
+
+class MLGWSession(asyncio.Protocol):
+    """A client connection to the MLGW protocol port."""
+
+    def __init__(self, simulator):
+        """Start without a login."""
+        self.simulator = simulator
+        self.transport = None
+        self.buffer = bytearray()
+        self.logged_in = not simulator.args.password
+
+    def connection_made(self, transport):
+        """Register the client, and ask for a login if a password is configured."""
+        self.transport = transport
+        _LOGGER.info("MLGW client connected: %s", transport.get_extra_info("peername"))
+        if self.logged_in:
+            self.simulator.mlgw_sessions.add(self)
+
+    def connection_lost(self, exc):
+        """Forget the client."""
+        self.simulator.mlgw_sessions.discard(self)
+        _LOGGER.info("MLGW client disconnected")
+
+    def send(self, telegram):
+        """Send a telegram, unless the client does not keep up with the storm."""
+        if self.transport.get_write_buffer_size() > 1 << 20:
+            self.simulator.counters["dropped"] += 1
+            return
+        self.transport.write(telegram)
+        self.simulator.counters["sent"] += 1
+
+    def data_received(self, data):
+        """Split the stream into telegrams and answer them."""
+        self.buffer += data
+        while len(self.buffer) >= MLGW_HEADER_LEN:
+            if self.buffer[0] != MLGW_SOH:
+                del self.buffer[0]
+                continue
+            size = MLGW_HEADER_LEN + self.buffer[2]
+            if len(self.buffer) < size:
+                break
+            telegram = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self.simulator.counters["received"] += 1
+            self.process(telegram[1], telegram[MLGW_HEADER_LEN:])
+
+    def process(self, msg_type, payload):
+        """Answer a telegram from the client."""
+        if msg_type == 0x30:  # Login request
+            user, _, password = payload.decode("latin-1").partition("\0")
+            self.logged_in = (
+                user == self.simulator.args.user
+                and password == self.simulator.args.password
+            )
+            self.send(mlgw_telegram(0x31, (0x00 if self.logged_in else 0x01,)))
+            if self.logged_in:
+                self.simulator.mlgw_sessions.add(self)
+        elif not self.logged_in:
+            self.send(mlgw_telegram(0x31, (0x01,)))  # Login status: FAIL
+        elif msg_type == 0x36:  # Ping
+            self.send(mlgw_telegram(0x37))
+        elif msg_type == 0x39:  # Request Serial Number
+            self.send(mlgw_telegram(0x3A, self.simulator.serial.encode("ascii")))
+        elif msg_type == 0x01 and len(payload) >= 3:  # Beo4 command
+            self.simulator.beo4_command(payload[0], payload[1], payload[2])
+        else:
+            _LOGGER.debug("MLGW: ignored telegram type 0x%02x: %s", msg_type, payload)
+
+
+class MLSession(asyncio.Protocol):
+    """A client connection to the ML CLI (telnet)."""
+
+    def __init__(self, simulator):
+        """Start at the login prompt."""
+        self.simulator = simulator
+        self.transport = None
+        self.buffer = b""
+        self.logged_in = False
+
+    def connection_made(self, transport):
+        """Show the login prompt."""
+        self.transport = transport
+        _LOGGER.info(
+            "ML CLI client connected: %s", transport.get_extra_info("peername")
+        )
+        transport.write(b"\r\nMLGW simulator\r\nlogin: ")
+
+    def connection_lost(self, exc):
+        """Stop logging to the client."""
+        self.simulator.ml_sessions.discard(self)
+        _LOGGER.info("ML CLI client disconnected")
+
+    def send(self, line):
+        """Send a log line, unless the client does not keep up with the storm."""
+        if self.transport.get_write_buffer_size() > 1 << 20:
+            self.simulator.counters["dropped"] += 1
+            return
+        self.transport.write(line)
+        self.simulator.counters["ml_sent"] += 1
+
+    def data_received(self, data):
+        """Handle the password and the commands, one line at a time."""
+        self.buffer += strip_telnet(data).replace(b"\0", b"")
+        while b"\n" in self.buffer:
+            line, _, self.buffer = self.buffer.partition(b"\n")
+            line = line.strip().decode("latin-1")
+            if not self.logged_in:
+                self.logged_in = line == self.simulator.args.password
+                if not self.logged_in:
+                    self.transport.write(b"\r\nLogin incorrect\r\nlogin: ")
+                    continue
+                self.transport.write(b"\r\nMLGW >")
+            elif line.upper() == "_MLLOG ONLINE":
+                self.simulator.ml_sessions.add(self)
+            elif line:
+                self.transport.write(b"\r\nMLGW >")
+
+
+async def handle_http(simulator, reader, writer):
+    """Answer the HTTP requests on a connection (keep-alive)."""
+    try:
+        while True:
+            request = await reader.readline()
+            if not request:
+                break
+            method, path, _ = request.decode("latin-1").split(" ", 2)
+            headers = {}
+            while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = header.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if method != "GET":
+                status, extra, body = 405, {}, b""
+            else:
+                status, extra, body = simulator.http_response(path, headers)
+            _LOGGER.info("HTTP %s %s: %s", method, path, status)
+            head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Status'}"]
+            head += [f"{key}: {value}" for key, value in extra.items()]
+            head.append(f"Content-Length: {len(body)}")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(args):
+    """Start the servers and the storms, and run until interrupted."""
+    simulator = Simulator(args)
+    loop = asyncio.get_running_loop()
+    servers = [
+        await loop.create_server(
+            lambda: MLGWSession(simulator), args.host, args.mlgw_port
+        ),
+        await loop.create_server(lambda: MLSession(simulator), args.host, args.ml_port),
+        await asyncio.start_server(
+            lambda r, w: handle_http(simulator, r, w), args.host, args.http_port
+        ),
+    ]
+    _LOGGER.info(
+        "Serving %s: MLGW %d, ML CLI %d, HTTP %d; MLN -> ML address: %s",
+        args.host,
+        args.mlgw_port,
+        args.ml_port,
+        args.http_port,
+        {mln: f"0x{ml:02x}" for mln, ml in simulator.ml_addresses.items()},
+    )
+
+    tasks = [asyncio.create_task(simulator.report())]
+    if args.storm_rate:
+        storm_types = [int(t, 16) for t in args.storm_types.split(",")]
+        tasks.append(
+            asyncio.create_task(
+                simulator.storm(
+                    args.storm_rate,
+                    lambda: simulator.storm_telegram(random.choice(storm_types)),
+                    simulator.broadcast,
+                )
+            )
+        )
+    if args.ml_storm_rate:
+        tasks.append(
+            asyncio.create_task(
+                simulator.storm(
+                    args.ml_storm_rate,
+                    simulator.ml_storm_telegram,
+                    simulator.ml_broadcast,
+                )
+            )
+        )
+    if args.config_changed_after:
+        await asyncio.sleep(args.config_changed_after)
+        simulator.configuration["timestamp"] = int(time.time())
+        simulator.broadcast(mlgw_telegram(0x38))
+        _LOGGER.info("Sent configuration change notification")
+    try:
+        await asyncio.gather(*tasks, *(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            server.close()
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--mlgw-port", type=int, default=9000)
+    parser.add_argument("--ml-port", type=int, default=23, help="ML CLI (telnet)")
+    parser.add_argument("--http-port", type=int, default=80)
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="mlgwpservices.json")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument(
+        "--password",
+        default="",
+        help="MLGW protocol and ML CLI password; empty: no login required",
+    )
+    parser.add_argument("--serial", help="serial number (default: from the config)")
+    parser.add_argument(
+        "--http-auth", choices=("none", "basic", "digest"), default="digest"
+    )
+    parser.add_argument(
+        "--storm-rate", type=float, default=0, help="MLGW notifications per second"
+    )
+    parser.add_argument(
+        "--storm-types",
+        default=",".join(f"{t:02x}" for t in STORM_TYPES),
+        help="comma separated hex MLGW notification types to send in the storm",
+    )
+    parser.add_argument(
+        "--ml-storm-rate", type=float, default=0, help="ML CLI lines per second"
+    )
+    parser.add_argument(
+        "--config-changed-after",
+        type=float,
+        default=0,
+        help="send a 0x38 configuration change notification after this many seconds",
+    )
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--debug", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    _args = parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if _args.debug else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    try:
+        asyncio.run(main(_args))
+    except KeyboardInterrupt:
+        pass